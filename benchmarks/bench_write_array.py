@@ -0,0 +1,132 @@
+# Copyright (C) 2025 Politecnico di Torino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Compares testit_util.write_array with the element-by-element emitter it replaced:
+# the layout must be the same (but for the "f" suffix of float32 values), and the time
+# to format large datasets is printed for both. Run it with
+#
+#   python benchmarks/bench_write_array.py
+
+import argparse
+import io
+import time
+
+import numpy as np
+
+from testit import testit_util
+
+
+def legacy_write_array(f, array, shape, indent=2):
+    """The previous write_array, writing one element at a time."""
+    flat_array = array.flatten()
+    num_dims = len(shape)
+    f.write(" " * indent)
+
+    for i, value in enumerate(flat_array):
+
+        f.write(f" {value}")
+
+        if i < len(flat_array) - 1:
+            f.write(",")
+            # Insert a newline after every "row" (last dimension)
+            if (i + 1) % shape[-1] == 0:
+                f.write("\n" + " " * indent)
+
+            # Insert a **blank line** when finishing a 2D block (2nd-to-last dimension)
+            if num_dims > 2 and (i + 1) % (shape[-2] * shape[-1]) == 0:
+                f.write("\n")
+
+            # Insert **two blank outputLines** when finishing a 3D block
+            if num_dims > 3 and (i + 1) % (shape[-3] * shape[-2] * shape[-1]) == 0:
+                f.write("\n\n")
+
+            # Insert **three blank outputLines** when finishing a 4D block, and so on...
+            if num_dims > 4:
+                for d in range(4, num_dims + 1):
+                    if (i + 1) % np.prod(shape[-d:]) == 0:
+                        f.write("\n" * (d - 2))
+
+    f.write("\n" + " " * indent)
+
+
+# Shapes of the layout check, from 1 to 6 dimensions, with unit dimensions
+LAYOUT_SHAPES = [
+    (7,),
+    (3, 4),
+    (2, 3, 4),
+    (2, 2, 3, 2),
+    (2, 3, 2, 2, 3),
+    (2, 2, 2, 2, 2, 2),
+    (1, 5),
+    (5, 1),
+    (3, 1, 2),
+    (4, 1, 1, 1, 1, 3),
+]
+
+# Datasets of the timing
+BENCHMARKS = [
+    ((1024, 1024), np.uint8),
+    ((1024, 1024), np.float32),
+    ((16, 16, 16, 16, 4), np.int32),
+]
+
+
+def format_array(write, array):
+    buffer = io.StringIO()
+    write(buffer, array, array.shape)
+    return buffer.getvalue()
+
+
+def check_layout(rng):
+    for shape in LAYOUT_SHAPES:
+        for dtype in (np.uint8, np.int32, np.int64, np.float64, np.float32):
+            array = rng.uniform(-100, 100, shape).astype(dtype)
+            expected = format_array(legacy_write_array, array)
+            actual = format_array(testit_util.write_array, array)
+            if dtype == np.float32:
+                actual = actual.replace("f", "")
+            assert actual == expected, f"layout of {shape} {np.dtype(dtype).name}"
+
+
+def best_time(write, array, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        format_array(write, array)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of write_array")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs of each case, the best is kept"
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    check_layout(rng)
+    print("Layout identical to the previous emitter")
+
+    for shape, dtype in BENCHMARKS:
+        array = rng.uniform(0, 200, shape).astype(dtype)
+        legacy = best_time(legacy_write_array, array, args.repeat)
+        current = best_time(testit_util.write_array, array, args.repeat)
+        name = "x".join(map(str, shape)) + " " + np.dtype(dtype).name
+        print(f"{name:<24} {legacy:6.2f}s -> {current:6.2f}s ({legacy / current:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
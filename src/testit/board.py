@@ -0,0 +1,617 @@
+# Copyright (C) 2025 Politecnico di Torino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pexpect
+import serial
+
+from . import elf_image
+from . import fake_board
+from . import gdb_mi
+from . import testit_util
+
+# Set this to True to enable debugging prints
+# TODO: REMOVE BEFORE RELEASE
+DEBUG_MODE = False
+
+# GDB port of the debugger when the target doesn't list its boards
+DEFAULT_GDB_PORT = 3333
+
+# Every GDB command is answered by a prompt: waiting for it keeps commands and answers in step
+GDB_PROMPT = "(gdb)"
+
+# Seconds to wait for a GDB command without a stage deadline, and to stop a hung application
+GDB_TIMEOUT = 30
+RECOVERY_TIMEOUT = 5
+
+# Command sent to check that a GDB session is still connected to the board, and how long
+# its answer can take. Answers containing one of the errors mean that the session is lost.
+DEFAULT_HEALTH_PROBE = "monitor version"
+PROBE_TIMEOUT = 2
+PROBE_ERRORS = (
+    "Remote connection closed",
+    "Remote communication error",
+    "The program has no registers now",
+    "not connected",
+)
+
+
+def print_deb(*args, **kwargs):
+    """Prints debug messages if DEBUG_MODE is set to True."""
+    if DEBUG_MODE:
+        print(*args, **kwargs)
+
+
+def get_boards(cfg):
+    """Creates the FPGA boards described by the target of config.test.
+
+    Args:
+        cfg (dict): The TestIt configuration.
+
+    Returns:
+        list: The boards of the target. A target without a "boards" list has a single board.
+    """
+    board_cfgs = cfg["target"].get("boards") or [{}]
+    return [Board(cfg, board_cfg, index) for index, board_cfg in enumerate(board_cfgs)]
+
+
+def _layout(image):
+    if image is None:
+        return None
+    entry, sections = image
+    return entry, [
+        (section.name, section.address, section.size) for section in sections
+    ]
+
+
+class Board:
+    """An FPGA board, with its serial port, its debugger and its GDB session.
+
+    Every board of a farm gets its own debugger instance and GDB port: Make receives
+    the "board_id", "usb_port" and "gdb_port" variables when the target lists its
+    boards. Boards with "backend: fake" replace the hardware with a pseudo-terminal
+    and a stub GDB (see fake_board), so that a farm can be exercised without boards.
+
+    GDB is driven either through its console ("gdbInterface: cli", the default), or
+    through its machine interface ("gdbInterface: mi", see gdb_mi).
+    """
+
+    def __init__(self, cfg, board_cfg, index):
+        self.cfg = cfg
+        self.board_cfg = board_cfg
+        self.index = index
+        self.name = board_cfg.get("name", f"board{index}")
+        self.usb_port = board_cfg.get("usbPort", cfg["target"].get("usbPort"))
+        self.baudrate = board_cfg.get("baudrate", cfg["target"].get("baudrate"))
+        self.binary_protocol = cfg["target"].get("serialProtocol", "text") == "binary"
+        self.gdb_port = board_cfg.get("gdbPort", DEFAULT_GDB_PORT + index)
+        self.backend = board_cfg.get("backend", "make")
+        self.health_probe = board_cfg.get(
+            "healthProbe", cfg["target"].get("healthProbe", DEFAULT_HEALTH_PROBE)
+        )
+        self.serial_comm_instance = None
+        self.serial_reader = None
+        self.fake_uart = None
+        self.fake_script = (
+            fake_board.FakeScript(self.name) if self.backend == "fake" else None
+        )
+        self.gdb_interface = board_cfg.get(
+            "gdbInterface", cfg["target"].get("gdbInterface", "cli")
+        )
+        self.deb = None
+        self.gdb = None
+        self.gdb_mi = None
+        self.exit_breakpoint = False
+
+        # Image held by the board, to reload only the sections that changed
+        self.fast_reload = board_cfg.get(
+            "fastReload", cfg["target"].get("fastReload", True)
+        )
+        self.loaded_image = None
+        self.sections_dir = None
+
+        # Health state
+        self.healthy = True
+        self.failures = 0
+        self.tests_run = 0
+        self.tests_failed = 0
+        self.restarts = 0
+        self.full_loads = 0
+        self.partial_loads = 0
+        self.tests_timed_out = 0
+
+        # Name, timeout and deadline of the stage of the running test
+        self.stage = None
+        # Stage in which the last failed test stopped, "load" or "run"
+        self.failed_stage = None
+
+    def make_args(self):
+        """Returns the Make variables that select this board, if the target lists its boards."""
+        if not self.cfg["target"].get("boards"):
+            return ""
+        return (
+            f" board_id={self.index} usb_port={self.usb_port} gdb_port={self.gdb_port}"
+        )
+
+    def serial_begin(self):
+        """Set-up serial communication with the board.
+
+        Returns:
+            bool: True if the serial communication was successfully set-up, False otherwise
+        """
+        try:
+            if self.backend == "fake":
+                self.fake_uart = fake_board.FakeUart()
+                port = self.fake_uart.port
+            else:
+                port = f"/dev/ttyUSB{self.usb_port}"
+
+            self.serial_comm_instance = serial.Serial(port, self.baudrate, timeout=1)
+
+            if not self.serial_comm_instance.is_open:
+                return False
+        except Exception as e:
+            print_deb(f"Serial setup of {self.name} failed: {e}")
+            return False
+
+        self.serial_reader = testit_util.SerialReader(
+            self.serial_comm_instance, binary=self.binary_protocol
+        )
+        self.serial_reader.start()
+
+        return True
+
+    def setup_deb(self):
+        """Set-up the debugger.
+
+        Returns:
+            bool: True if the debugger was successfully set-up, False otherwise.
+        """
+        if self.backend == "fake":
+            self.deb = pexpect.spawn(
+                sys.executable, ["-m", "testit.fake_board", "--debugger"]
+            )
+        else:
+            deb_cmd = f"""
+            cd {os.getcwd()}
+            make deb-setup{self.make_args()}
+            """
+            self.deb = pexpect.spawn(f"/bin/bash -c '{deb_cmd}'")
+
+        if self.deb.isalive():
+            return True
+        else:
+            print({self.deb.exitstatus})
+            return False
+
+    def setup_gdb(self):
+        """Set-up the GDB debugger and connect it to the debugger of the board.
+
+        Returns:
+            bool: True if the GDB debugger was successfully set-up, False otherwise.
+        """
+        if self.backend == "fake":
+            args = self.fake_script.gdb_args(self.fake_uart.socket_path)
+            if self.gdb_interface == "mi":
+                args.append("--mi")
+            if self.binary_protocol:
+                args.append("--binary")
+            self.gdb = pexpect.spawn(sys.executable, args)
+        else:
+            gdb_args = self.make_args()
+            if self.gdb_interface == "mi":
+                gdb_args += f" gdb_interpreter={gdb_mi.MI_INTERPRETER}"
+            gdb_cmd = f"""
+            cd {os.getcwd()}
+            make gdb-setup{gdb_args}
+            """
+            self.gdb = pexpect.spawn(f"/bin/bash -c '{gdb_cmd}'")
+
+        self.exit_breakpoint = False
+        self.loaded_image = None
+        if self.gdb_interface == "mi":
+            return self._setup_gdb_mi()
+
+        try:
+            self.gdb.expect_exact(GDB_PROMPT)
+            for command in (
+                "set pagination off",
+                "set confirm off",
+                "set remotetimeout 2000",
+                f"target extended-remote localhost:{self.gdb_port}",
+            ):
+                self.gdb.sendline(command)
+                self.gdb.expect_exact(GDB_PROMPT)
+        except (pexpect.EOF, pexpect.TIMEOUT):
+            pass
+
+        if self.gdb.isalive():
+            print_deb("GDB process is still running.")
+            return True
+        print_deb("GDB process has terminated.")
+        if self.gdb.exitstatus is not None:
+            print(f"GDB exit status: {self.gdb.exitstatus}")
+        if self.gdb.signalstatus is not None:
+            print(f"GDB terminated by signal: {self.gdb.signalstatus}")
+        return False
+
+    def _setup_gdb_mi(self):
+        self.gdb_mi = gdb_mi.MiSession(self.gdb)
+        try:
+            self.gdb_mi.wait_prompt()
+            self.gdb_mi.command("-gdb-set pagination off")
+            self.gdb_mi.command("-gdb-set confirm off")
+            self.gdb_mi.command("-gdb-set remotetimeout 2000")
+            self.gdb_mi.command(
+                f"-target-select extended-remote localhost:{self.gdb_port}"
+            )
+        except (pexpect.EOF, pexpect.TIMEOUT, gdb_mi.MiError) as e:
+            print(f"GDB setup of {self.name} failed: {e}")
+            self.gdb.terminate(force=True)
+            return False
+        return True
+
+    def stop_gdb(self):
+        """Stop the GDB debugger."""
+        if self.gdb is not None and self.gdb.isalive():
+            self.gdb.sendcontrol("c")
+            self.gdb.terminate(force=True)
+
+    def stop_deb(self):
+        """Stop the debugger."""
+        if self.deb is not None and self.deb.isalive():
+            self.deb.sendcontrol("c")
+            self.deb.terminate(force=True)
+
+    def health(self):
+        """Returns the health counters of the board."""
+        return {
+            "healthy": self.healthy,
+            "testsRun": self.tests_run,
+            "testsFailed": self.tests_failed,
+            "testsTimedOut": self.tests_timed_out,
+            "restarts": self.restarts,
+            "fullLoads": self.full_loads,
+            "partialLoads": self.partial_loads,
+        }
+
+    def close(self):
+        """Stop the debugger and close the serial port."""
+        self.stop_gdb()
+        self.stop_deb()
+        if self.serial_reader is not None:
+            self.serial_reader.stop()
+        if self.serial_comm_instance is not None and self.serial_comm_instance.is_open:
+            self.serial_comm_instance.close()
+        if self.fake_uart is not None:
+            self.fake_uart.close()
+        if self.sections_dir is not None:
+            shutil.rmtree(self.sections_dir, ignore_errors=True)
+            self.sections_dir = None
+
+    def probe(self):
+        """Check that GDB is still answering and connected to the debugger of the board.
+
+        Returns:
+            bool: True if the session is healthy, False otherwise.
+        """
+        if self.gdb is None or not self.gdb.isalive():
+            return False
+
+        if self.gdb_interface == "mi":
+            try:
+                self.gdb_mi.console_command(self.health_probe, timeout=PROBE_TIMEOUT)
+            except (pexpect.EOF, pexpect.TIMEOUT, gdb_mi.MiError):
+                return False
+            answer = "".join(self.gdb_mi.console)
+            return not any(error in answer for error in PROBE_ERRORS)
+
+        try:
+            self.gdb.sendline(self.health_probe)
+            self.gdb.expect_exact(GDB_PROMPT, timeout=PROBE_TIMEOUT)
+        except (pexpect.EOF, pexpect.TIMEOUT):
+            return False
+
+        answer = self.gdb.before.decode("utf-8", errors="replace")
+        return not any(error in answer for error in PROBE_ERRORS)
+
+    def ensure_session(self):
+        """Keep the debugger session alive, restarting it only if the health probe fails.
+
+        Returns:
+            bool: True if the session is healthy, False if it could not be restarted.
+        """
+        if self.probe():
+            return True
+
+        print_deb(f"Debugger session of {self.name} lost, restarting it.")
+        return self.restart()
+
+    def restart(self):
+        """Stop the debugger and GDB, then set them up again.
+
+        Returns:
+            bool: True if both were successfully set-up again, False otherwise.
+        """
+        self.restarts += 1
+        self.stop_gdb()
+        self.stop_deb()
+
+        if not self.setup_deb() and not self.setup_deb():
+            print(f"ERROR: Failed to re-setup debugger of {self.name}")
+            return False
+
+        if not self.setup_gdb() and not self.setup_gdb():
+            print(f"ERROR: Failed to re-setup GDB of {self.name}")
+            return False
+
+        return True
+
+    def run_test(self, elf=None, load_timeout=None, run_timeout=None):
+        """Load the compiled application on the board via GDB and run it.
+
+        Args:
+            elf (str, optional): The application image to load, instead of the one GDB was started with. Defaults to None.
+            load_timeout (float, optional): Seconds the load of the application can take. Defaults to None.
+            run_timeout (float, optional): Seconds the application can run. Defaults to None.
+
+        Raises:
+            testit_util.StageTimeout: If the load or the run didn't complete in time. The
+                application is stopped and the board is reset before raising.
+
+        Returns:
+            list: The lines received from the serial port, or None if the test failed.
+                With the binary protocol, the records received as bytes.
+        """
+        # Check that the serial connection is still open
+        if not self.serial_comm_instance.is_open:
+            print(f"ERROR: Serial port of {self.name} is not open!")
+            return None
+
+        self.tests_run += 1
+        self.failed_stage = "load"
+        if not self.ensure_session():
+            self.tests_failed += 1
+            return None
+
+        # Anything received before the test started belongs to no test
+        self.serial_reader.clear()
+
+        try:
+            if self.gdb_interface == "mi":
+                finished = self._load_and_run_mi(elf, load_timeout, run_timeout)
+            else:
+                finished = self._load_and_run(elf, load_timeout, run_timeout)
+
+            if not finished:
+                self.failed_stage = self.stage[0] if self.stage else "load"
+                self.tests_failed += 1
+                self.loaded_image = None
+                return None
+
+            # Wait for the end of the test output
+            frame = self.serial_reader.next_frame(self._time_left(None))
+            if frame is None:
+                self._check_deadline()
+                self.failed_stage = "run"
+                self.tests_failed += 1
+                return None
+        except testit_util.StageTimeout:
+            self.tests_timed_out += 1
+            self.loaded_image = None
+            self._recover()
+            raise
+        finally:
+            self.stage = None
+
+        if self.binary_protocol:
+            return frame
+        return frame.decode("utf-8", errors="replace").splitlines()
+
+    def _begin_stage(self, stage, timeout):
+        self.stage = (
+            stage,
+            timeout,
+            None if timeout is None else time.monotonic() + timeout,
+        )
+
+    def _time_left(self, default=GDB_TIMEOUT):
+        """Seconds left to the current stage, or the default if the stage has no deadline."""
+        if self.stage is None or self.stage[2] is None:
+            return default
+        self._check_deadline()
+        return self.stage[2] - time.monotonic()
+
+    def _check_deadline(self):
+        """Raises StageTimeout if the current stage missed its deadline."""
+        if self.stage is None or self.stage[2] is None:
+            return
+        stage, timeout, deadline = self.stage
+        if time.monotonic() >= deadline:
+            raise testit_util.StageTimeout(stage, timeout)
+
+    def _recover(self):
+        """Stop the application that missed its deadline and reset the board.
+
+        Returns:
+            bool: True if the board is ready for the next test, False otherwise.
+        """
+        stage = self.stage[0] if self.stage is not None else None
+        self.stage = None
+        try:
+            if self.gdb_interface == "mi":
+                if stage != "run":
+                    return self.restart()
+                self.gdb_mi.command("-exec-interrupt", timeout=RECOVERY_TIMEOUT)
+                self.gdb_mi.wait_stopped(RECOVERY_TIMEOUT)
+                self.gdb_mi.console_command(
+                    "monitor reset halt", timeout=RECOVERY_TIMEOUT
+                )
+            else:
+                self.gdb.sendcontrol("c")
+                self.gdb.expect_exact(GDB_PROMPT, timeout=RECOVERY_TIMEOUT)
+                # Drop whatever the interrupted command still prints
+                try:
+                    while True:
+                        self.gdb.read_nonblocking(size=4096, timeout=0.5)
+                except pexpect.TIMEOUT:
+                    pass
+                self.gdb.sendline("monitor reset halt")
+                self.gdb.expect_exact(GDB_PROMPT, timeout=RECOVERY_TIMEOUT)
+        except (pexpect.EOF, pexpect.TIMEOUT, gdb_mi.MiError) as e:
+            print_deb(f"Cannot stop the application on {self.name}: {e}")
+            return self.restart()
+        return True
+
+    def _console(self, command):
+        """Run a GDB console command, whatever the interface of the session."""
+        if self.gdb_interface == "mi":
+            self.gdb_mi.console_command(command, timeout=self._time_left())
+        else:
+            self.gdb.sendline(command)
+            self.gdb.expect_exact(GDB_PROMPT, timeout=self._time_left())
+
+    def _full_load(self):
+        self.gdb.sendline("load")
+        self.gdb.expect_exact(GDB_PROMPT, timeout=self._time_left())
+        print_deb("Current gdb output:", self.gdb.before)
+
+    def _load_image(self, elf, full_load):
+        """Load the image on the board.
+
+        When the board already holds an image with the same layout, only the sections
+        whose content changed and the writable ones, which the previous run may have
+        modified, are written back with GDB "restore", instead of downloading them all.
+
+        Args:
+            elf (str): The application image, or None for the one GDB was started with.
+            full_load (function): Downloads the whole image with GDB "load".
+        """
+        image = None
+        if self.fast_reload and elf is not None:
+            try:
+                image = elf_image.read_sections(elf)
+            except (OSError, elf_image.ElfError) as e:
+                print_deb(f"Cannot read the sections of {elf}: {e}")
+
+        loaded_image = self.loaded_image
+        self.loaded_image = None
+
+        if image is None or _layout(image) != _layout(loaded_image):
+            full_load()
+            self.full_loads += 1
+            self.loaded_image = image
+            return
+
+        if self.sections_dir is None:
+            self.sections_dir = tempfile.mkdtemp(prefix=f"testit_{self.name}_")
+
+        entry, sections = image
+        loaded_digests = {section.name: section.digest for section in loaded_image[1]}
+        for index, section in enumerate(sections):
+            if section.writable or section.digest != loaded_digests[section.name]:
+                blob = os.path.join(self.sections_dir, f"{index}.bin")
+                elf_image.extract_section(elf, section, blob)
+                self._console(f"restore {blob} binary {section.address:#x}")
+
+        # Like "load", start the application from its entry point
+        self._console(f"set $pc = {entry:#x}")
+        self.partial_loads += 1
+        self.loaded_image = image
+
+    def _load_and_run(self, elf, load_timeout, run_timeout):
+        try:
+            self._begin_stage("load", load_timeout)
+
+            # Point GDB to the pre-compiled image
+            if elf is not None:
+                self._console(f"file {os.path.abspath(elf)}")
+
+            # Reset the mcu
+            self._console("monitor reset halt")
+
+            # Run the testbench with gdb
+            self._load_image(elf, self._full_load)
+
+            # The breakpoint at the exit lasts as long as the GDB session
+            if not self.exit_breakpoint:
+                self._console("b _exit")
+                self.exit_breakpoint = True
+
+            self._begin_stage("run", run_timeout)
+            self.gdb.sendline("continue")
+
+            while True:
+                index = self.gdb.expect(
+                    [r"Breakpoint", pexpect.TIMEOUT], timeout=min(10, self._time_left())
+                )
+                if index == 0:
+                    print_deb("Program finished execution.")
+                    return True
+        except pexpect.EOF:
+            print_deb(f"GDB of {self.name} terminated during the test.")
+            return False
+        except pexpect.TIMEOUT:
+            self._check_deadline()
+            print_deb(f"GDB of {self.name} is not answering.")
+            self.gdb.terminate()
+            return False
+
+    def _load_and_run_mi(self, elf, load_timeout, run_timeout):
+        try:
+            self._begin_stage("load", load_timeout)
+
+            # Point GDB to the pre-compiled image
+            if elf is not None:
+                self.gdb_mi.command(
+                    f"-file-exec-and-symbols {gdb_mi.mi_quote(os.path.abspath(elf))}",
+                    timeout=self._time_left(),
+                )
+
+            # Reset the mcu and load the image: the result record marks the end of the load
+            self._console("monitor reset halt")
+            self._load_image(
+                elf,
+                lambda: self.gdb_mi.command(
+                    "-target-download", timeout=self._time_left()
+                ),
+            )
+
+            # The breakpoint at the exit lasts as long as the GDB session
+            if not self.exit_breakpoint:
+                self.gdb_mi.command("-break-insert _exit", timeout=self._time_left())
+                self.exit_breakpoint = True
+
+            self._begin_stage("run", run_timeout)
+            # GDB also stops on connection and after an interrupt: only the stops that
+            # follow -exec-continue belong to the test
+            self.gdb_mi.clear_stops()
+            self.gdb_mi.command("-exec-continue", timeout=self._time_left())
+            while True:
+                try:
+                    stop = self.gdb_mi.wait_stopped(timeout=min(10, self._time_left()))
+                except pexpect.TIMEOUT:
+                    continue
+                print_deb(f"Target of {self.name} stopped: {stop}")
+                return stop.get("reason") == "breakpoint-hit"
+        except (pexpect.EOF, pexpect.TIMEOUT, gdb_mi.MiError) as e:
+            self._check_deadline()
+            print_deb(f"GDB of {self.name} failed during the test: {e}")
+            return False
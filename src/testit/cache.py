@@ -0,0 +1,433 @@
+# Copyright (C) 2025 Politecnico di Torino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+import fcntl
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+# Default location and size bound of the TestIt cache
+DEFAULT_CACHE_DIR = ".testit_cache"
+DEFAULT_MAX_SIZE_MB = 1024
+
+# Stores kept in the TestIt cache directory
+CACHE_NAMES = ["build", "golden"]
+
+# Files of the application directory that affect the build
+SOURCE_EXTENSIONS = (".c", ".h", ".s", ".S", ".cpp", ".hpp", ".cc", ".ld", ".mk")
+
+
+def hash_files(hasher, paths, root=None):
+    """Feeds the path and the content of some files to a hash object.
+
+    Args:
+        hasher (hashlib._Hash): The hash object to update.
+        paths (list): The files to hash, in a stable order.
+        root (str, optional): Directory the hashed names are relative to. Defaults to None.
+    """
+    for path in paths:
+        name = os.path.relpath(path, root) if root is not None else path
+        hasher.update(name.encode("utf-8") + b"\0")
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                hasher.update(chunk)
+        hasher.update(b"\0")
+
+
+def hash_arrays(hasher, arrays):
+    """Feeds the type, the shape and the values of some arrays to a hash object.
+
+    Args:
+        hasher (hashlib._Hash): The hash object to update.
+        arrays (list): The NumPy arrays to hash, in a stable order.
+    """
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        hasher.update(f"\0{array.dtype.str}{array.shape}\0".encode("utf-8"))
+        hasher.update(array.data)
+
+
+def _dir_size(path):
+    """Returns the total size of the files in a directory tree."""
+    size = 0
+    for root, _, files in os.walk(path):
+        size += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return size
+
+
+class DiskCache:
+    """A size-bounded, least-recently-used store of directories on disk.
+
+    Every entry is a directory named after its key. Reading an entry refreshes its
+    modification time, and the oldest entries are evicted once the total size of
+    the store exceeds its limit. The size of the entries is scanned once, then kept
+    in an index, and the hit/miss counters are kept in memory until save_counters().
+    """
+
+    def __init__(self, cache_dir, name, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        self.dir = os.path.join(cache_dir, name)
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        # Modification time and size of each entry, by path, and their total size
+        self.index = None
+        self.total_size = 0
+        # Hits and misses not yet saved in .stats.json
+        self.counters = {}
+        os.makedirs(self.dir, exist_ok=True)
+
+    def entry_dir(self, key):
+        """Returns the directory of an entry."""
+        return os.path.join(self.dir, key)
+
+    def lookup(self, key):
+        """Looks up an entry and marks it as the most recently used one.
+
+        Args:
+            key (str): The key of the entry.
+
+        Returns:
+            str: The directory of the entry, or None on a cache miss.
+        """
+        entry = self.entry_dir(key)
+        with self.lock:
+            if not os.path.isdir(entry):
+                self._count("misses")
+                return None
+            os.utime(entry)
+            if self.index is not None and entry in self.index:
+                self.index[entry][0] = time.time()
+            self._count("hits")
+        return entry
+
+    def commit(self, key, staging_dir):
+        """Publishes a fully written staging directory as an entry, then evicts old entries.
+
+        Args:
+            key (str): The key of the entry.
+            staging_dir (str): The directory holding the entry content.
+        """
+        entry = self.entry_dir(key)
+        with self.lock:
+            index = self._index()
+            if os.path.isdir(entry):
+                shutil.rmtree(staging_dir, ignore_errors=True)
+            else:
+                os.replace(staging_dir, entry)
+                if entry not in index:
+                    size = _dir_size(entry)
+                    index[entry] = [os.path.getmtime(entry), size]
+                    self.total_size += size
+            self._evict()
+
+    def staging_dir(self, key):
+        """Returns a fresh directory in which a new entry can be written."""
+        staging = os.path.join(self.dir, f".{key}.{threading.get_ident()}.tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        return staging
+
+    def stats(self):
+        """Returns the number of entries, their size in bytes, and the hit/miss counters."""
+        entries = self._entries()
+        counters = self._load_counters()
+        return {
+            "entries": len(entries),
+            "size": sum(size for _, _, size in entries),
+            "maxSize": self.max_size,
+            "hits": counters.get("hits", 0) + self.counters.get("hits", 0),
+            "misses": counters.get("misses", 0) + self.counters.get("misses", 0),
+        }
+
+    def save_counters(self):
+        """Adds the hits and misses counted since the last call to .stats.json, under a
+        file lock, as other TestIt processes can share the store."""
+        with self.lock:
+            if not self.counters:
+                return
+            with open(os.path.join(self.dir, ".stats.lock"), "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                counters = self._load_counters()
+                for counter, count in self.counters.items():
+                    counters[counter] = counters.get(counter, 0) + count
+                stats_path = os.path.join(self.dir, ".stats.json")
+                with open(f"{stats_path}.{os.getpid()}.tmp", "w") as file:
+                    json.dump(counters, file)
+                os.replace(f"{stats_path}.{os.getpid()}.tmp", stats_path)
+            self.counters = {}
+
+    def clear(self):
+        """Removes every entry and resets the counters."""
+        with self.lock:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            os.makedirs(self.dir, exist_ok=True)
+            self.index = None
+            self.total_size = 0
+            self.counters = {}
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.dir):
+            path = os.path.join(self.dir, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            entries.append((os.path.getmtime(path), path, _dir_size(path)))
+        return entries
+
+    def _index(self):
+        # The store is scanned on the first commit only, then the index follows it
+        if self.index is None:
+            self.index = {path: [mtime, size] for mtime, path, size in self._entries()}
+            self.total_size = sum(size for _, size in self.index.values())
+        return self.index
+
+    def _evict(self):
+        if self.total_size <= self.max_size:
+            return
+        for path, (_, size) in sorted(self.index.items(), key=lambda item: item[1][0]):
+            if self.total_size <= self.max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            del self.index[path]
+            self.total_size -= size
+
+    def _load_counters(self):
+        try:
+            with open(os.path.join(self.dir, ".stats.json"), "r") as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _count(self, counter):
+        self.counters[counter] = self.counters.get(counter, 0) + 1
+
+
+class BuildCache(DiskCache):
+    """Caches the artifacts of application builds, keyed on everything the build reads."""
+
+    def __init__(self, cache_dir, max_size_mb, target, artifacts, extra_sources=None):
+        super().__init__(cache_dir, "build", max_size_mb)
+        self.target = target
+        self.artifacts = artifacts
+        self.extra_sources = extra_sources or []
+
+    @classmethod
+    def from_config(cls, cfg):
+        """Creates the build cache described by config.test.
+
+        Args:
+            cfg (dict): The TestIt configuration.
+
+        Returns:
+            BuildCache: The build cache, or None if it is not enabled.
+        """
+        cache_cfg = cfg.get("cache")
+        if (
+            not cache_cfg
+            or not cache_cfg.get("build", True)
+            or "elf" not in cfg["target"]
+        ):
+            return None
+
+        return cls(
+            cache_cfg.get("dir", DEFAULT_CACHE_DIR),
+            cache_cfg.get("maxSize", DEFAULT_MAX_SIZE_MB),
+            cfg["target"],
+            [cfg["target"]["elf"]] + cfg["target"].get("artifacts", []),
+            cache_cfg.get("extraSources", []),
+        )
+
+    def artifact_paths(self, app_name, app_dir):
+        """Returns the build artifacts of an application."""
+        return [
+            artifact.format(app=app_name, app_dir=app_dir)
+            for artifact in self.artifacts
+        ]
+
+    def key(self, app_name, app_dir, compile_cmd, gen_files_name):
+        """Computes the key of a build from its sources, generated files and target.
+
+        Args:
+            app_name (str): The name of the application.
+            app_dir (str): The directory of the application sources.
+            compile_cmd (str): The command that builds the application.
+            gen_files_name (str): The name of the generated data files.
+
+        Returns:
+            str: The key of the build.
+        """
+        # Private copies of the application directory build the same sources
+        compile_cmd = compile_cmd.replace(os.path.abspath(app_dir), "{app_dir}")
+
+        hasher = hashlib.sha256()
+        for field in (self.target["name"], self.target["type"], app_name, compile_cmd):
+            hasher.update(str(field).encode("utf-8") + b"\0")
+
+        for source_dir in [app_dir] + self.extra_sources:
+            sources = []
+            for root, dirs, files in os.walk(source_dir):
+                dirs.sort()
+                for file_name in sorted(files):
+                    if file_name.endswith(SOURCE_EXTENSIONS) or file_name == "Makefile":
+                        sources.append(os.path.join(root, file_name))
+            hash_files(hasher, sources, source_dir)
+
+        # Binary datasets are part of the build, like the generated sources
+        blobs = sorted(glob.glob(os.path.join(app_dir, f"{gen_files_name}_*.bin")))
+        hash_files(hasher, blobs, app_dir)
+
+        return hasher.hexdigest()
+
+    def restore(self, key, app_name, app_dir):
+        """Copies the artifacts of a cached build back in place.
+
+        Returns:
+            bool: True on a cache hit, False otherwise.
+        """
+        entry = self.lookup(key)
+        if entry is None:
+            return False
+
+        for index, artifact in enumerate(self.artifact_paths(app_name, app_dir)):
+            os.makedirs(os.path.dirname(os.path.abspath(artifact)), exist_ok=True)
+            shutil.copy2(os.path.join(entry, str(index)), artifact)
+        return True
+
+    def store(self, key, app_name, app_dir):
+        """Saves the artifacts of a successful build.
+
+        Returns:
+            bool: True if every artifact was found and saved, False otherwise.
+        """
+        staging = self.staging_dir(key)
+        for index, artifact in enumerate(self.artifact_paths(app_name, app_dir)):
+            if not os.path.exists(artifact):
+                shutil.rmtree(staging, ignore_errors=True)
+                return False
+            shutil.copy2(artifact, os.path.join(staging, str(index)))
+
+        self.commit(key, staging)
+        return True
+
+
+class GoldenCache(DiskCache):
+    """Memoizes the reference values returned by the golden functions.
+
+    Entries are keyed on the input datasets, the parameter values, the function name
+    and the source of the golden module, and hold one ".npy" file per returned array.
+    """
+
+    def __init__(self, cache_dir, max_size_mb, golden_path):
+        super().__init__(cache_dir, "golden", max_size_mb)
+        self.golden_path = golden_path
+        self.golden_mtime = None
+        self.source_hash = None
+        self.refresh_source()
+
+    def refresh_source(self):
+        """Hashes the golden module again if it was modified, discarding stale entries."""
+        mtime = os.path.getmtime(self.golden_path)
+        if mtime == self.golden_mtime:
+            return
+
+        with open(self.golden_path, "rb") as file:
+            self.source_hash = hashlib.sha256(file.read()).hexdigest()
+        self.golden_mtime = mtime
+
+        # Entries computed by an older version of the golden module are never hit again
+        source_file = os.path.join(self.dir, ".source")
+        try:
+            with open(source_file, "r") as file:
+                stale = file.read() != self.source_hash
+        except FileNotFoundError:
+            stale = False
+        if stale:
+            self.clear()
+        with open(source_file, "w") as file:
+            file.write(self.source_hash)
+
+    @classmethod
+    def from_config(cls, cfg, golden_path):
+        """Creates the golden cache described by config.test.
+
+        Args:
+            cfg (dict): The TestIt configuration.
+            golden_path (str): The path of the golden module.
+
+        Returns:
+            GoldenCache: The golden cache, or None if it is not enabled.
+        """
+        cache_cfg = cfg.get("cache")
+        if (
+            not cache_cfg
+            or not cache_cfg.get("golden", True)
+            or not os.path.exists(golden_path)
+        ):
+            return None
+
+        return cls(
+            cache_cfg.get("dir", DEFAULT_CACHE_DIR),
+            cache_cfg.get("maxSize", DEFAULT_MAX_SIZE_MB),
+            golden_path,
+        )
+
+    def key(self, function_name, input_arrays, parameters):
+        """Computes the key of a golden function call.
+
+        Args:
+            function_name (str): The name of the golden function.
+            input_arrays (list): The input datasets passed to the function.
+            parameters (list): The parameters passed to the function.
+
+        Returns:
+            str: The key of the call.
+        """
+        self.refresh_source()
+
+        hasher = hashlib.sha256()
+        hasher.update(f"{self.source_hash}\0{function_name}\0".encode("utf-8"))
+        hasher.update(
+            json.dumps(parameters, sort_keys=True, default=str).encode("utf-8")
+        )
+        hash_arrays(hasher, input_arrays)
+        return hasher.hexdigest()
+
+    def load(self, key):
+        """Loads the memory-mapped reference values of a call.
+
+        Returns:
+            list: The reference values, or None on a cache miss.
+        """
+        entry = self.lookup(key)
+        if entry is None:
+            return None
+
+        count = len([name for name in os.listdir(entry) if name.endswith(".npy")])
+        return [
+            np.load(os.path.join(entry, f"{index}.npy"), mmap_mode="r")
+            for index in range(count)
+        ]
+
+    def save(self, key, golden_results):
+        """Saves the reference values of a call."""
+        staging = self.staging_dir(key)
+        for index, golden_result in enumerate(golden_results):
+            np.save(os.path.join(staging, f"{index}.npy"), golden_result)
+        self.commit(key, staging)
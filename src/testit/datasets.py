@@ -0,0 +1,229 @@
+# Copyright (C) 2025 Politecnico di Torino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Generators of the input datasets. An input dataset picks its generator with the
+# "generator" field, "uniform" by default, and every generator draws the whole array at
+# once from the random stream of the test iteration. Generators are looked up in
+# GENERATORS, then in the DATASET_GENERATORS dictionary of testit_golden.py, where a
+# campaign can register its own: they take the same arguments as the built-in ones.
+# Generators that can draw the same values twice, e.g. from a short list of recorded
+# datasets, set their "deterministic" attribute, so that runs sharing their parameters
+# can be recognized as duplicates.
+
+import numpy as np
+
+from . import testit_util
+
+# Fraction of corner values of the "boundary" generator
+BOUNDARY_RATE = 0.5
+
+# Fraction of non-zero values of the "sparse" generator
+SPARSE_DENSITY = 0.1
+
+
+def _field(dataset, field):
+    """Returns a field of a dataset that its generator requires."""
+    if field not in dataset:
+        raise ValueError(
+            f"the {dataset.get('generator', 'uniform')} generator of dataset {dataset['name']} requires '{field}'"
+        )
+    return dataset[field]
+
+
+def uniform(rng, dataset, shape, dtype):
+    """Values drawn uniformly from "valueRange", whose upper bound is excluded.
+
+    Args:
+        rng (numpy.random.Generator): The random stream of the test iteration.
+        dataset (dict): The dataset entry of the configuration file.
+        shape (tuple): The shape of the dataset.
+        dtype (numpy.dtype): The element type of the dataset.
+
+    Returns:
+        numpy.ndarray: The dataset.
+    """
+    low, high = _field(dataset, "valueRange")
+    if np.issubdtype(dtype, np.integer):
+        return rng.integers(low, high, size=shape, dtype=dtype)
+    return rng.uniform(low, high, size=shape).astype(dtype)
+
+
+def boundary(rng, dataset, shape, dtype):
+    """Uniform values, a "boundaryRate" fraction of which is replaced by corner cases:
+    the bounds of "valueRange" and their neighbours, and the values around zero. As in
+    "uniform", the upper bound is excluded: the highest corner is the value below it."""
+    low, high = _field(dataset, "valueRange")
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        candidates = [low, low + 1, high - 2, high - 1, -1, 0, 1]
+        candidates = [
+            value
+            for value in candidates
+            if low <= value < high and info.min <= value <= info.max
+        ]
+    else:
+        tiny = float(np.finfo(dtype).tiny)
+        top = float(np.nextafter(dtype.type(high), dtype.type(low)))
+        candidates = [low, top, 0.0, -tiny, tiny]
+        candidates = [value for value in candidates if low <= value < high]
+    corners = np.unique(np.array(candidates, dtype=dtype))
+
+    values = uniform(rng, dataset, shape, dtype)
+    replaced = rng.random(shape) < dataset.get("boundaryRate", BOUNDARY_RATE)
+    return np.where(replaced, rng.choice(corners, size=shape), values)
+
+
+def sparse(rng, dataset, shape, dtype):
+    """Zeros, but for a "density" fraction of uniform values."""
+    values = uniform(rng, dataset, shape, dtype)
+    kept = rng.random(shape) < dataset.get("density", SPARSE_DENSITY)
+    return np.where(kept, values, np.zeros((), dtype=dtype))
+
+
+def normal(rng, dataset, shape, dtype):
+    """Normally distributed values, clipped to "valueRange", whose upper bound is excluded.
+    The "mean" and "std" default to the middle of the range and a sixth of its width."""
+    low, high = _field(dataset, "valueRange")
+    values = rng.normal(
+        dataset.get("mean", (low + high) / 2),
+        dataset.get("std", (high - low) / 6),
+        size=shape,
+    )
+    if np.issubdtype(dtype, np.integer):
+        return np.clip(np.rint(values), low, high - 1).astype(dtype)
+    values = values.astype(dtype)
+    return np.clip(values, low, np.nextafter(dtype.type(high), dtype.type(low)))
+
+
+def fixed_point(rng, dataset, shape, dtype):
+    """Uniform real values of "valueRange", in fixed point with "fracBits" fractional bits."""
+    if not np.issubdtype(dtype, np.integer):
+        raise ValueError(
+            f"the fixed generator of dataset {dataset['name']} requires an integer dataType"
+        )
+    low, high = _field(dataset, "valueRange")
+    scale = 1 << _field(dataset, "fracBits")
+    info = np.iinfo(dtype)
+    values = np.rint(rng.uniform(low, high, size=shape) * scale)
+    return np.clip(values, info.min, info.max).astype(dtype)
+
+
+def float32_to_bfloat16(values):
+    """Rounds values to the nearest bfloat16, ties to even.
+
+    Returns:
+        numpy.ndarray: The bfloat16 bit patterns, as uint16.
+    """
+    bits = np.asarray(values, dtype=np.float32).view(np.uint32)
+    rounding = np.uint32(0x7FFF) + ((bits >> 16) & 1)
+    return ((bits + rounding) >> 16).astype(np.uint16)
+
+
+def bfloat16_to_float32(bits):
+    """Converts bfloat16 bit patterns back to float32, e.g. in a golden function."""
+    return (np.asarray(bits, dtype=np.uint16).astype(np.uint32) << 16).view(np.float32)
+
+
+def bfloat16(rng, dataset, shape, dtype):
+    """Uniform real values of "valueRange", as bfloat16 bit patterns in a uint16_t dataset."""
+    if dtype != np.uint16:
+        raise ValueError(
+            f"the bfloat16 generator of dataset {dataset['name']} requires the uint16_t dataType"
+        )
+    low, high = _field(dataset, "valueRange")
+    return float32_to_bfloat16(rng.uniform(low, high, size=shape))
+
+
+def npy(rng, dataset, shape, dtype):
+    """Recorded values, loaded from the .npy "file". The file holds either the dataset, or
+    a stack of datasets along its first axis, one of which is picked at random. The file
+    is memory-mapped, and only the values of the dataset are read."""
+    path = _field(dataset, "file")
+    array = np.load(path, mmap_mode="r")
+    if array.shape[1:] == shape:
+        array = array[rng.integers(len(array))]
+    elif array.shape != shape:
+        raise ValueError(
+            f"the shape {array.shape} of '{path}' doesn't match the shape {shape} of dataset {dataset['name']}"
+        )
+    return np.array(array, dtype=dtype)
+
+
+# A file holds few datasets, which runs of the campaign are likely to share
+npy.deterministic = True
+
+
+# Built-in generators, by the name of the "generator" field of an input dataset
+GENERATORS = {
+    "uniform": uniform,
+    "boundary": boundary,
+    "sparse": sparse,
+    "normal": normal,
+    "fixed": fixed_point,
+    "bfloat16": bfloat16,
+    "npy": npy,
+}
+
+
+def get_generator(name):
+    """Returns a generator, built-in or registered in testit_golden.py, or None."""
+    if name in GENERATORS:
+        return GENERATORS[name]
+    module = testit_util.get_golden_module().load()
+    return getattr(module, "DATASET_GENERATORS", {}).get(name)
+
+
+def is_deterministic(dataset):
+    """Returns True if the generator of a dataset can draw the same values twice."""
+    generator = get_generator(dataset.get("generator", "uniform"))
+    return getattr(generator, "deterministic", False)
+
+
+def missing_generators(names):
+    """Returns the generators that are neither built-in nor registered."""
+    return [name for name in names if get_generator(name) is None]
+
+
+def generate(rng, dataset, shape):
+    """Generates an input dataset with its generator.
+
+    Args:
+        rng (numpy.random.Generator): The random stream of the test iteration.
+        dataset (dict): The dataset entry of the configuration file.
+        shape (tuple): The shape of the dataset.
+
+    Raises:
+        ValueError: If the datatype or the generator is not supported, or the
+            generator can't produce the dataset.
+
+    Returns:
+        numpy.ndarray: The dataset.
+    """
+    datatype = dataset["dataType"]
+    if datatype not in testit_util.C_TYPES:
+        raise ValueError(f"unsupported datatype '{datatype}'")
+    dtype = np.dtype(testit_util.C_TYPES[datatype])
+
+    name = dataset.get("generator", "uniform")
+    generator = get_generator(name)
+    if generator is None:
+        raise ValueError(f"unknown generator '{name}' of dataset {dataset['name']}")
+
+    array = np.asarray(generator(rng, dataset, shape, dtype))
+    if array.shape != shape:
+        raise ValueError(
+            f"the {name} generator returned a {array.shape} array for dataset {dataset['name']} of shape {shape}"
+        )
+    return array.astype(dtype, copy=False)
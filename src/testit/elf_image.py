@@ -0,0 +1,133 @@
+# Copyright (C) 2025 Politecnico di Torino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Minimal reader of the sections that GDB "load" writes to the target, used to reload
+# only the sections of an application image that changed since the previous test.
+
+import collections
+import hashlib
+import struct
+
+# Section flags and types of the ELF format
+SHF_WRITE = 0x1
+SHF_ALLOC = 0x2
+SHT_NOBITS = 8
+PT_LOAD = 1
+
+# A loadable section: "address" is its load address (LMA), "writable" tells whether the
+# application can modify it at runtime, "digest" is the hash of its content.
+Section = collections.namedtuple(
+    "Section", ["name", "address", "offset", "size", "writable", "digest"]
+)
+
+# Layouts of the file header (after e_ident), of the section headers and of the
+# program headers, for 32-bit and 64-bit images
+_LAYOUTS = {
+    1: ("HHIIIIIHHHHHH", "IIIIIIIIII", "IIIIIIII"),
+    2: ("HHIQQQIHHHHHH", "IIQQQQIIQQ", "IIQQQQQQ"),
+}
+
+
+class ElfError(Exception):
+    """Raised when a file is not a valid ELF image."""
+
+
+def read_sections(path):
+    """Reads the entry point and the loadable sections of an ELF image.
+
+    Args:
+        path (str): The path of the image.
+
+    Returns:
+        tuple: The entry point and the list of Section, in file order.
+
+    Raises:
+        ElfError: If the file is not a valid ELF image.
+    """
+    with open(path, "rb") as file:
+        image = file.read()
+
+    if image[:4] != b"\x7fELF" or image[4] not in _LAYOUTS or image[5] not in (1, 2):
+        raise ElfError(f"{path} is not an ELF image")
+    endianness = "<" if image[5] == 1 else ">"
+    header_layout, section_layout, segment_layout = (
+        endianness + layout for layout in _LAYOUTS[image[4]]
+    )
+
+    try:
+        header = struct.unpack_from(header_layout, image, 16)
+        entry, phoff, shoff = header[3], header[4], header[5]
+        phentsize, phnum, shentsize, shnum, shstrndx = header[8:]
+
+        segments = []
+        for index in range(phnum):
+            fields = struct.unpack_from(
+                segment_layout, image, phoff + index * phentsize
+            )
+            if image[4] == 1:
+                p_type, p_offset, _, p_paddr, p_filesz = fields[:5]
+            else:
+                p_type, _, p_offset, _, p_paddr, p_filesz = fields[:6]
+            if p_type == PT_LOAD:
+                segments.append((p_offset, p_filesz, p_paddr))
+
+        headers = [
+            struct.unpack_from(section_layout, image, shoff + index * shentsize)
+            for index in range(shnum)
+        ]
+    except struct.error as e:
+        raise ElfError(f"{path} is truncated: {e}")
+
+    names_offset = headers[shstrndx][4] if shstrndx < len(headers) else 0
+
+    sections = []
+    for sh_name, sh_type, sh_flags, sh_addr, sh_offset, sh_size, *_ in headers:
+        if not sh_flags & SHF_ALLOC or sh_type == SHT_NOBITS or sh_size == 0:
+            continue
+
+        name_start = names_offset + sh_name
+        name = image[name_start : image.index(b"\0", name_start)].decode(
+            "utf-8", errors="replace"
+        )
+
+        # GDB loads sections at their load address, given by the segment holding them
+        address = sh_addr
+        for p_offset, p_filesz, p_paddr in segments:
+            if p_offset <= sh_offset < p_offset + p_filesz:
+                address = p_paddr + sh_offset - p_offset
+                break
+
+        content = image[sh_offset : sh_offset + sh_size]
+        sections.append(
+            Section(
+                name,
+                address,
+                sh_offset,
+                sh_size,
+                bool(sh_flags & SHF_WRITE),
+                hashlib.sha256(content).hexdigest(),
+            )
+        )
+
+    return entry, sections
+
+
+def extract_section(path, section, output_path):
+    """Writes the content of a section to a raw binary file, for GDB "restore"."""
+    with open(path, "rb") as file:
+        file.seek(section.offset)
+        content = file.read(section.size)
+    with open(output_path, "wb") as file:
+        file.write(content)
@@ -0,0 +1,273 @@
+# Copyright (C) 2025 Politecnico di Torino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# A fake FPGA board, used to run TestIt campaigns without any hardware (e.g. in CI).
+# The serial port of the board is a pseudo-terminal, and its GDB is a stub process
+# that answers the commands TestIt sends and "runs" the application by printing a
+# fixed output on the pseudo-terminal. The stub speaks either the GDB console or the
+# GDB machine interface, so it doubles as a mock MI server.
+#
+# What the fake boards print, and the faults they inject, are not part of config.test:
+# tests describe them in the TESTIT_FAKE_BOARDS environment variable, a JSON object
+# that maps the name of a board to its "output" lines, the number of GDB sessions
+# that crash ("failures") and the number of runs that hang ("hangs").
+
+import argparse
+import json
+import os
+import pty
+import re
+import shutil
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+import tty
+
+from . import testit_util
+
+
+class FakeUart:
+    """The serial port of a fake board.
+
+    TestIt opens the slave side of a pseudo-terminal, while the stub GDB connects to a
+    Unix socket: everything it sends is written to the master side of the terminal.
+    """
+
+    def __init__(self):
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+
+        self.tmp_dir = tempfile.mkdtemp(prefix="testit_fake_uart_")
+        self.socket_path = os.path.join(self.tmp_dir, "uart.sock")
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.socket_path)
+        self.server.listen()
+
+        self.relay_thread = threading.Thread(target=self._relay, daemon=True)
+        self.relay_thread.start()
+
+    def _relay(self):
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                return
+            with connection:
+                for data in iter(lambda: connection.recv(4096), b""):
+                    os.write(self.master, data)
+
+    def close(self):
+        """Closes the pseudo-terminal and the socket."""
+        self.server.close()
+        os.close(self.master)
+        os.close(self.slave)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+# Environment variable that describes the fake boards
+BOARDS_ENV = "TESTIT_FAKE_BOARDS"
+
+# Output of a fake board that TESTIT_FAKE_BOARDS doesn't describe
+DEFAULT_OUTPUT = ["0:0:1"]
+
+
+class FakeScript:
+    """The behaviour of a fake board, read from TESTIT_FAKE_BOARDS."""
+
+    def __init__(self, name):
+        spec = json.loads(os.environ.get(BOARDS_ENV) or "{}").get(name, {})
+        self.output = spec.get("output", DEFAULT_OUTPUT)
+        self.failures = spec.get("failures", 0)
+        self.hangs = spec.get("hangs", 0)
+
+    def gdb_args(self, uart_socket):
+        """Returns the arguments of the next stub GDB session, using up its faults."""
+        args = ["-m", "testit.fake_board", "--uart", uart_socket]
+        for line in self.output:
+            args += ["--output", line]
+        if self.failures > 0:
+            self.failures -= 1
+            args.append("--crash")
+        if self.hangs > 0:
+            args += ["--hang", str(self.hangs)]
+            self.hangs = 0
+        return args
+
+
+# Set by the --binary option
+_binary = False
+
+
+def _write(text):
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+def _run_gdb(uart_socket, output_lines, crash, hangs):
+    running = [False]
+
+    # Like GDB, stop the application on Ctrl-C
+    def interrupt(signum, frame):
+        if running[0]:
+            running[0] = False
+            _write("\nProgram received signal SIGINT, Interrupt.\n(gdb) ")
+        else:
+            _write("Quit\n(gdb) ")
+
+    signal.signal(signal.SIGINT, interrupt)
+    _write("GNU gdb (TestIt fake board)\n(gdb) ")
+
+    for line in sys.stdin:
+        command = line.strip()
+
+        if command == "continue":
+            if crash:
+                return 1
+            _write("Continuing.\n")
+            if hangs > 0:
+                hangs -= 1
+                running[0] = True
+                continue
+            _send_uart(uart_socket, output_lines)
+            time.sleep(0.05)
+            _write("\nBreakpoint 1, 0x00000000 in _exit ()\n(gdb) ")
+        elif command == "load":
+            _write(
+                "Loading section .text, size 0x0 lma 0x0\nTransfer rate: 0 KB/sec.\n(gdb) "
+            )
+        elif command.startswith("file "):
+            _write(f"Reading symbols from {command[5:]}...\n(gdb) ")
+        elif command.startswith("b "):
+            _write("Breakpoint 1 at 0x0\n(gdb) ")
+        elif command in ("quit", "q"):
+            return 0
+        else:
+            _write("(gdb) ")
+
+    return 0
+
+
+def _send_uart(uart_socket, output_lines):
+    # With the binary protocol, each "a:b:c" line is sent as a RESULT record
+    if _binary:
+        data = b"".join(
+            testit_util.encode_record(
+                testit_util.RECORD_RESULT,
+                struct.pack(f"<{line.count(':') + 1}i", *map(int, line.split(":"))),
+            )
+            for line in output_lines
+        ) + testit_util.encode_record(testit_util.RECORD_END)
+    else:
+        data = "".join(f"{out}\n" for out in output_lines + ["&"]).encode()
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as uart:
+        uart.connect(uart_socket)
+        uart.sendall(data)
+
+
+def _run_gdb_mi(uart_socket, output_lines, crash, hangs):
+    running = False
+    _write('=thread-group-added,id="i1"\n(gdb) \n')
+
+    for line in sys.stdin:
+        token, command = re.match(r"(\d*)(.*)", line.strip()).groups()
+        answer = f"{token}^done"
+
+        if command == "-exec-continue":
+            if crash:
+                return 1
+            _write(f'{token}^running\n*running,thread-id="all"\n(gdb) \n')
+            if hangs > 0:
+                hangs -= 1
+                running = True
+                continue
+            _send_uart(uart_socket, output_lines)
+            time.sleep(0.05)
+            _write(
+                '*stopped,reason="breakpoint-hit",disp="keep",bkptno="1",'
+                'frame={addr="0x00000000",func="_exit",args=[]},thread-id="1"\n(gdb) \n'
+            )
+            continue
+        elif command == "-exec-interrupt" and running:
+            running = False
+            _write(
+                f'{answer}\n(gdb) \n*stopped,reason="signal-received",signal-name="SIGINT"\n'
+            )
+            answer = ""
+        elif command == "-target-download":
+            _write('+download,{section=".text",section-size="0",total-size="0"}\n')
+            answer += ',address="0x0",load-size="0",transfer-rate="0",write-rate="0"'
+        elif command.startswith("-break-insert"):
+            answer += ',bkpt={number="1",type="breakpoint",func="_exit"}'
+        elif command.startswith("-target-select"):
+            # Like GDB, report the target halted by the connection
+            _write(f"{token}^connected\n(gdb) \n")
+            _write(
+                '*stopped,frame={addr="0x00000000",func="??",args=[]},'
+                'thread-id="1",stopped-threads="all"\n'
+            )
+            continue
+        elif command.startswith("-interpreter-exec console"):
+            _write('~"Open On-Chip Debugger (TestIt fake board)\\n"\n')
+        elif command == "-gdb-exit":
+            _write(f"{token}^exit\n")
+            return 0
+
+        _write(f"{answer}\n(gdb) \n")
+
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TestIt fake FPGA board")
+    parser.add_argument("--debugger", action="store_true", help="Act as the debugger")
+    parser.add_argument("--uart", help="Socket of the fake serial port")
+    parser.add_argument(
+        "--output", action="append", default=[], help="Line printed by the application"
+    )
+    parser.add_argument(
+        "--mi", action="store_true", help="Use the GDB machine interface"
+    )
+    parser.add_argument(
+        "--binary", action="store_true", help="Use the binary serial protocol"
+    )
+    parser.add_argument(
+        "--hang",
+        type=int,
+        default=0,
+        help="Number of runs in which the application never terminates",
+    )
+    parser.add_argument(
+        "--crash", action="store_true", help="Terminate GDB when the application starts"
+    )
+    args = parser.parse_args()
+
+    if args.debugger:
+        while True:
+            time.sleep(3600)
+
+    global _binary
+    _binary = args.binary
+    run_gdb = _run_gdb_mi if args.mi else _run_gdb
+    sys.exit(run_gdb(args.uart, args.output or DEFAULT_OUTPUT, args.crash, args.hang))
+
+
+if __name__ == "__main__":
+    main()
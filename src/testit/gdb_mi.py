@@ -0,0 +1,207 @@
+# Copyright (C) 2025 Politecnico di Torino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Driver of the GDB machine interface (GDB/MI). Every command is sent with a numeric
+# token and is answered by a result record carrying the same token, while the target
+# state changes are reported by asynchronous records such as "*stopped". TestIt reacts
+# to these records as soon as they arrive, instead of scraping the console output.
+
+import collections
+import re
+import time
+
+import pexpect
+
+# Interpreter passed to GDB by the "gdb-setup" target
+MI_INTERPRETER = "mi3"
+
+# A line of MI output: the kind is "result", "exec", "status", "notify", "console",
+# "target" or "log". Stream records only have a text, the others a class and results.
+MiRecord = collections.namedtuple(
+    "MiRecord", ["token", "kind", "cls", "results", "text"]
+)
+
+_RECORD_KINDS = {
+    "^": "result",
+    "*": "exec",
+    "+": "status",
+    "=": "notify",
+    "~": "console",
+    "@": "target",
+    "&": "log",
+}
+_RECORD = re.compile(r"(\d*)([\^*+=~@&])(.*)")
+_VARIABLE = re.compile(r"([\w-]+)=")
+
+
+class MiError(Exception):
+    """Raised when GDB answers a command with an error record."""
+
+
+def mi_quote(text):
+    """Quotes a command argument as an MI c-string."""
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _parse_cstring(text, pos):
+    end = pos + 1
+    while text[end] != '"':
+        end += 2 if text[end] == "\\" else 1
+    raw = text[pos + 1 : end]
+    value = raw.encode("latin-1", "backslashreplace").decode("unicode_escape")
+    return value, end + 1
+
+
+def _parse_value(text, pos):
+    if text[pos] == '"':
+        return _parse_cstring(text, pos)
+
+    closing = {"{": "}", "[": "]"}[text[pos]]
+    items = []
+    pos += 1
+    while text[pos] != closing:
+        # Tuples only hold results, lists hold either results or plain values
+        match = _VARIABLE.match(text, pos)
+        name = None
+        if match is not None:
+            name = match.group(1)
+            pos = match.end()
+        value, pos = _parse_value(text, pos)
+        items.append((name, value))
+        if text[pos] == ",":
+            pos += 1
+
+    if closing == "}":
+        return dict(items), pos + 1
+    return [value for _, value in items], pos + 1
+
+
+def parse_record(line):
+    """Parses a line of MI output.
+
+    Args:
+        line (str): The line, without its terminator.
+
+    Returns:
+        MiRecord: The record, or None if the line is not an MI record (e.g. the prompt).
+    """
+    match = _RECORD.fullmatch(line.strip())
+    if match is None:
+        return None
+
+    token, prefix, rest = match.groups()
+    token = int(token) if token else None
+    kind = _RECORD_KINDS[prefix]
+
+    try:
+        if kind in ("console", "target", "log"):
+            text, _ = _parse_cstring(rest, 0)
+            return MiRecord(token, kind, None, {}, text)
+
+        cls, _, results = rest.partition(",")
+        results = _parse_value("{" + results + "}", 0)[0] if results else {}
+    except (IndexError, KeyError):
+        return None
+    return MiRecord(token, kind, cls, results, None)
+
+
+class MiSession:
+    """A GDB process started with the MI interpreter."""
+
+    def __init__(self, process):
+        self.process = process
+        self.token = 0
+        # Console output of the last command
+        self.console = []
+        # "*stopped" records not yet waited for
+        self.stops = collections.deque()
+
+    def _read_line(self, deadline):
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            raise pexpect.TIMEOUT("No answer from GDB")
+        self.process.expect("\n", timeout=timeout)
+        return self.process.before.decode("utf-8", errors="replace").rstrip("\r")
+
+    def _read_record(self, deadline):
+        while True:
+            record = parse_record(self._read_line(deadline))
+            if record is None:
+                continue
+            if record.kind == "exec" and record.cls == "stopped":
+                self.stops.append(record)
+            return record
+
+    def wait_prompt(self, timeout=30):
+        """Waits for the first prompt of GDB, once it's ready to receive commands."""
+        deadline = time.monotonic() + timeout
+        while self._read_line(deadline).strip() != "(gdb)":
+            pass
+
+    def command(self, command, timeout=30):
+        """Sends an MI command and waits for its result record.
+
+        Args:
+            command (str): The MI command, e.g. "-target-download".
+            timeout (int, optional): Seconds to wait for the result. Defaults to 30.
+
+        Returns:
+            MiRecord: The result record.
+
+        Raises:
+            MiError: If GDB answered with an error.
+            pexpect.TIMEOUT: If GDB didn't answer in time.
+            pexpect.EOF: If GDB terminated.
+        """
+        self.token += 1
+        token = self.token
+        self.console = []
+        self.process.sendline(f"{token}{command}")
+
+        deadline = time.monotonic() + timeout
+        while True:
+            record = self._read_record(deadline)
+            if record.kind == "console":
+                self.console.append(record.text)
+            elif record.kind == "result" and record.token == token:
+                if record.cls == "error":
+                    raise MiError(record.results.get("msg", ""))
+                return record
+
+    def console_command(self, command, timeout=30):
+        """Runs a CLI command, e.g. "monitor reset halt", through the MI interpreter."""
+        return self.command(f"-interpreter-exec console {mi_quote(command)}", timeout)
+
+    def clear_stops(self):
+        """Drops the "*stopped" records received so far, e.g. on connection."""
+        self.stops.clear()
+
+    def wait_stopped(self, timeout):
+        """Waits for the target to stop.
+
+        Args:
+            timeout (int): Seconds to wait for the target.
+
+        Returns:
+            dict: The results of the "*stopped" record, e.g. its "reason" and "frame".
+
+        Raises:
+            pexpect.TIMEOUT: If the target is still running.
+            pexpect.EOF: If GDB terminated.
+        """
+        deadline = time.monotonic() + timeout
+        while not self.stops:
+            self._read_record(deadline)
+        return self.stops.popleft().results
@@ -28,6 +28,13 @@ def main():
         "report", help="Generate a report based on the test results"
     )
 
+    cache_parser = subparsers.add_parser(
+        "cache", help="Inspect or clear the TestIt cache"
+    )
+    cache_parser.add_argument(
+        "action", choices=["stats", "clear"], help="Show cache statistics or clear it"
+    )
+
     # Add a flag to the 'run' command to indicate if the FPGA model has already been synthesized
     run_parser.add_argument(
         "--nobuild", action="store_true", help="Avoid building the model"
@@ -39,6 +46,36 @@ def main():
         help="Test every possible combination of parameters",
     )
 
+    run_parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of simulation tests to run in parallel (sim targets only)",
+    )
+
+    run_parser.add_argument(
+        "--pipeline",
+        type=int,
+        nargs="?",
+        const=1,
+        default=0,
+        metavar="DEPTH",
+        help="Compile the next tests while the current one runs on the FPGA board, staging up to DEPTH images (default: 1)",
+    )
+
+    run_parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the last campaign, skipping the tests it already completed",
+    )
+
+    run_parser.add_argument(
+        "--replay",
+        nargs=2,
+        metavar=("TEST", "ITERATION"),
+        help="Generate again the datasets of a test iteration of the last campaign, from its recorded seed",
+    )
+
     run_parser.add_argument(
         "--mammamia", action="store_true", help="Let's cook some pasta"
     )
@@ -59,12 +96,27 @@ def main():
 
     args = parser.parse_args()
 
+    if args.command == "run" and args.replay is not None:
+        if not args.replay[1].isdigit():
+            run_parser.error("the ITERATION of --replay must be a non-negative integer")
+        args.replay = (args.replay[0], int(args.replay[1]))
+
     if args.command == "run":
-        run.testit_run(args.nobuild, args.mammamia, args.sweep)
+        run.testit_run(
+            args.nobuild,
+            args.mammamia,
+            args.sweep,
+            args.jobs,
+            args.pipeline,
+            args.resume,
+            args.replay,
+        )
     elif args.command == "setup":
         run.testit_setup()
     elif args.command == "report":
         run.testit_report(args.sort_key, not args.descending)
+    elif args.command == "cache":
+        run.testit_cache(args.action)
 
 
 if __name__ == "__main__":
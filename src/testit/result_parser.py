@@ -0,0 +1,212 @@
+# Copyright (C) 2025 Politecnico di Torino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Extraction of the results of a test from its output. Simulation dumps can hold
+# hundreds of thousands of trace lines, so they are read in chunks, and the lines that
+# can't contain a result are discarded with a substring search before the regex runs.
+
+import re
+
+from . import testit_util
+
+# Size of the chunks the output files are read in
+CHUNK_SIZE = 1 << 20
+
+# Converters of the tags listed in "outputTypes"
+TAG_TYPES = {
+    "str": str,
+    "int": lambda value: int(value, 10),
+    "hex": lambda value: int(value, 16),
+    "float": float,
+}
+
+_SPECIAL = set(".^$*+?{}()[]|\\")
+_QUANTIFIERS = ("*", "?", "{")
+_REPEAT = re.compile(r"\{\d*(,\d*)?\}")
+# A whole escape: "\x41", "\u0041", "\N{...}", octal codes and backreferences are longer
+# than two characters
+_ESCAPE = re.compile(r"\\(N\{[^}]*\}|[xuU][0-9a-fA-F]*|\d+|.)", re.DOTALL)
+
+
+def required_literal(pattern):
+    """Finds a text that every match of a regex contains, to filter lines cheaply.
+
+    Args:
+        pattern (str): The regex.
+
+    Returns:
+        str: The longest literal run of the regex outside groups, which might be empty.
+    """
+    flags = re.compile(pattern).flags
+    if flags & (re.IGNORECASE | re.VERBOSE):
+        return ""
+
+    runs = [""]
+    depth = 0
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        literal = None
+        if char == "\\":
+            # Escaped punctuation is literal, "\d", "\x41" and the like end the run
+            escape = _ESCAPE.match(pattern, index)
+            if escape is None:
+                break
+            escaped = escape.group(1)
+            if len(escaped) == 1 and not escaped.isalnum():
+                literal = escaped
+            index = escape.end()
+        elif char == "[":
+            index += 1
+            if pattern[index : index + 1] == "^":
+                index += 1
+            if pattern[index : index + 1] == "]":
+                index += 1
+            while index < len(pattern) and pattern[index] != "]":
+                index += 2 if pattern[index] == "\\" else 1
+            index += 1
+        elif _REPEAT.match(pattern, index):
+            index = _REPEAT.match(pattern, index).end()
+        else:
+            if char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+            elif char == "|" and depth == 0:
+                # Each alternative has its own literals
+                return ""
+            elif char not in _SPECIAL:
+                literal = char
+            index += 1
+
+        quantifier = pattern[index : index + 1]
+        if literal is None or depth > 0 or quantifier in _QUANTIFIERS:
+            runs.append("")
+        else:
+            runs[-1] += literal
+            # "a+" requires one "a", but what follows isn't contiguous to it
+            if quantifier == "+":
+                runs.append("")
+
+    return max(runs, key=len)
+
+
+def iter_lines(path, chunk_size=CHUNK_SIZE):
+    """Streams the lines of a file as bytes, without their terminators."""
+    with open(path, "rb") as f:
+        rest = b""
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            lines = (rest + chunk).split(b"\n")
+            rest = lines.pop()
+            yield from lines
+        if rest:
+            yield rest
+
+
+class ResultParser:
+    """Extracts the results of a test from its output lines or records."""
+
+    def __init__(self, pattern, output_tags, output_types=None):
+        self.pattern = re.compile(pattern)
+        self.output_tags = list(output_tags)
+        self.literal = required_literal(pattern)
+        self.converters = {
+            tag: TAG_TYPES[tag_type] for tag, tag_type in (output_types or {}).items()
+        }
+
+    def _result(self, values):
+        result = {}
+        for tag, value in zip(self.output_tags, values):
+            converter = self.converters.get(tag)
+            if converter is not None and value is not None:
+                try:
+                    value = converter(value)
+                except ValueError:
+                    pass
+            result[tag] = value
+        return result
+
+    def parse_lines(self, lines):
+        """Extracts a result from each matching line.
+
+        Args:
+            lines (iterable): The output lines, as str.
+
+        Returns:
+            list: A dictionary of tagged values for each matching line.
+        """
+        results = []
+        for line in lines:
+            if self.literal not in line:
+                continue
+            match = self.pattern.search(line)
+            if match:
+                results.append(self._result(match.groups()))
+        return results
+
+    def parse_records(self, data):
+        """Extracts the results of the binary records of a test."""
+        return [
+            self._result(result.values())
+            for result in testit_util.decode_results(data, self.output_tags)
+        ]
+
+    def parse_file(self, path, binary=False):
+        """Extracts the results of a test from its output file.
+
+        Args:
+            path (str): The output file.
+            binary (bool, optional): True if the file holds binary records. Defaults to False.
+
+        Returns:
+            list: A dictionary of tagged values for each result.
+        """
+        if binary:
+            with open(path, "rb") as f:
+                return self.parse_records(f.read())
+
+        literal = self.literal.encode("utf-8")
+        return self.parse_lines(
+            line.rstrip(b"\r").decode("utf-8", errors="replace")
+            for line in iter_lines(path)
+            if literal in line
+        )
+
+
+_parsers = {}
+
+
+def get_parser(pattern, output_tags, output_types=None):
+    """Returns the parser of a test, compiled the first time it's needed.
+
+    Args:
+        pattern (str): The regex that matches a result line.
+        output_tags (list): The tags associated to the regex groups.
+        output_types (dict, optional): The type of some tags, among TAG_TYPES. Defaults to None.
+
+    Returns:
+        ResultParser: The parser.
+    """
+    key = (
+        pattern,
+        tuple(output_tags),
+        tuple(sorted((output_types or {}).items())),
+    )
+    if key not in _parsers:
+        _parsers[key] = ResultParser(pattern, output_tags, output_types)
+    return _parsers[key]
@@ -23,14 +23,15 @@ from rich.progress import (
 )
 from rich.status import Status
 import rich
+from . import cache
 from . import testit
+from . import testit_util
+import hashlib
 import os
 import threading
 import queue
-import time
 
 import os
-import time
 import json
 from rich import print
 from rich.progress import (
@@ -41,9 +42,18 @@ from rich.progress import (
     SpinnerColumn,
 )
 from rich.status import Status
+from rich.table import Table
 
 
-def testit_run(no_build=False, italian_mode=False, sweep_mode=False):
+def testit_run(
+    no_build=False,
+    italian_mode=False,
+    sweep_mode=False,
+    jobs=1,
+    pipeline_depth=0,
+    resume=False,
+    replay=None,
+):
 
     current_directory = os.getcwd()
 
@@ -61,7 +71,6 @@ def testit_run(no_build=False, italian_mode=False, sweep_mode=False):
 
     # Create the TestIt object
     testEnv = testit.TestItEnv(data)
-    testEnv.clear_results()
 
     if not italian_mode:
         rich.print("[cyan]Setting up TestIt project...[/cyan]")
@@ -78,19 +87,59 @@ def testit_run(no_build=False, italian_mode=False, sweep_mode=False):
         )
         rich.print("   Please ensure that the Makefile contains the required targets")
         exit(1)
-    elif not run_util._configuration_check(data, sweep_mode):
+    elif not run_util._configuration_check(data, sweep_mode, pipeline_depth > 0):
         rich.print(
             " - [bold red]ERROR: there is an issue with config.test critical parameters![/bold red]"
         )
         exit(1)
+    elif not testEnv.load_golden():
+        rich.print(
+            " - [bold red]ERROR: testit_golden.py doesn't define every golden function and dataset generator![/bold red]"
+        )
+        exit(1)
     else:
         if not italian_mode:
             rich.print(
-                " - Target project Makefile and config.test check [bold green][OK][/bold green]"
+                " - Target project Makefile, config.test and testit_golden.py check [bold green][OK][/bold green]"
             )
         else:
             rich.print(" - Nonna's recipe [bold green][READ][/bold green]")
 
+    if replay is not None:
+        exit(0 if run_util._replay(testEnv, data, sweep_mode, *replay) else 1)
+
+    # The campaign can only be resumed with the same configuration and sweep mode
+    fingerprint = hashlib.sha256(
+        json.dumps({"config": data, "sweep": sweep_mode}, sort_keys=True).encode()
+    ).hexdigest()
+
+    if resume and not testEnv.checkpoint.load():
+        rich.print(
+            "[yellow]WARNING[/yellow]: no interrupted campaign to resume, starting a new one"
+        )
+        resume = False
+    elif resume and testEnv.checkpoint.campaign["fingerprint"] != fingerprint:
+        rich.print(
+            "[bold red]ERROR: config.test or the sweep mode changed since the interrupted campaign![/bold red]"
+        )
+        rich.print("Please run the campaign again without --resume.")
+        exit(1)
+
+    if resume:
+        # Drop the results of the runs that were interrupted, they run again
+        testit_util.prune_database(
+            data["report"]["dir"],
+            {(run["test"], run["iteration"]) for run in testEnv.checkpoint.runs},
+        )
+        for test in data["tests"]:
+            test["completedIterations"] = testEnv.checkpoint.completed(test["appName"])
+        previous_durations = testEnv.checkpoint.durations()
+    else:
+        testEnv.clear_results()
+        testEnv.checkpoint.start(fingerprint, data["target"].get("seed"))
+        previous_durations = {}
+    testEnv.seed = testEnv.checkpoint.seed
+
     if not no_build:
         # Build the model
         if not italian_mode:
@@ -115,7 +164,7 @@ def testit_run(no_build=False, italian_mode=False, sweep_mode=False):
             rich.print(" - Model build phase [bold green][SKIPPED][/bold green]")
         else:
             rich.print(" - Using [bold green][DRIED][/bold green] pasta")
-        
+
     # If the target is an FPGA board, load the model, then setup the serial connection and GDB
     if data["target"]["type"] == "fpga":
         if not italian_mode:
@@ -211,25 +260,9 @@ def testit_run(no_build=False, italian_mode=False, sweep_mode=False):
         transient=True,
     ) as progress:
 
-        # Compute the total test iterations
-        if not sweep_mode:
-            test_iterations = data["target"]["iterations"]
-        else:
-            sweep_test_iterations = run_util._get_tot_sweep_iterations(data)
-
-            test_index = 0
-            for test in data["tests"]:
-                test["totIterations"] = sweep_test_iterations[test_index]
-                test["currentIteration"] = 0
-                test_index += 1
-
-            if isinstance(sweep_test_iterations, list):
-                test_iterations = max(sweep_test_iterations)
-            else:
-                test_iterations = sweep_test_iterations
-
+        if sweep_mode:
             rich.print(
-                "[yellow]WARNING[/yellow]: sweep mode is active, TestIt will cycle through each possible combination of parameters for each test"
+                "[yellow]WARNING[/yellow]: sweep mode is active, TestIt will cycle through the parameter points picked by the sweep strategy of each test"
             )
 
         if not italian_mode:
@@ -237,97 +270,58 @@ def testit_run(no_build=False, italian_mode=False, sweep_mode=False):
         else:
             task_message = " - Cooking..."
 
-        task = progress.add_task(task_message, total=test_iterations, start=False)
-        start = False
-
-        test_counter = 0
-
-        test_duration_report = {}
-
-        for test_iteration in range(test_iterations):
-            if not testEnv.gen_datasets(sweep_mode, test_iteration):
-                rich.print(f" - [bold red]ERROR: Dataset generation failed![/bold red]")
-                exit(1)
-
-            update_list_of_tests = False
-
-            # Prepare a list for the current iteration's test durations
-            test_duration_report[test_iteration] = []
-
-            for test in data["tests"]:
-                start_time = time.time()
-
-                # Re-setup debugger every 10 tests if using FPGA
-                if test_counter == 10 and data["target"]["type"] == "fpga":
-                    test_counter = 0
-                    testEnv.stop_gdb()
-                    testEnv.stop_deb()
-
-                    deb_setup_success = testEnv.setup_deb()
-                    if not deb_setup_success:
-                        deb_setup_again_success = testEnv.setup_deb()
-                        if not deb_setup_again_success:
-                            rich.print(
-                                f" - [bold red]ERROR: Failed to re-setup debugger[/bold red]"
-                            )
-                            exit(1)
-
-                    gdb_setup_success = testEnv.setup_gdb()
-                    if not gdb_setup_success:
-                        gdb_setup_again_success = testEnv.setup_gdb()
-                        if not gdb_setup_again_success:
-                            rich.print(
-                                f" - [bold red]ERROR: Failed to re-setup GDB[/bold red]"
-                            )
-                            exit(1)
-                else:
-                    test_counter += 1
-
-                if not testEnv.launch_test(
-                    app_name=test["appName"],
-                    iteration=test_iteration,
-                    pattern=rf"{test['outputFormat']}",
-                    output_tags=test["outputTags"],
-                    timeout_t=1000,
-                ):
-                    rich.print(
-                        f" - [bold red]ERROR: Test {test['appName']} failed because of GDB timeout[/bold red]"
-                    )
-                    exit(1)
-
-                if not start:
-                    progress.start_task(task)
-                    start = True
-
-                progress.update(
-                    task,
-                    advance=1,
-                    description=f" - [cyan]{test_iteration + 1}/{test_iterations}: {test['appName']}",
-                    refresh=True,
-                )
+        if jobs > 1 and data["target"]["type"] == "fpga":
+            rich.print(
+                "[yellow]WARNING[/yellow]: parallel jobs are only supported on simulation targets, running one test at a time"
+            )
+            jobs = 1
 
-                if sweep_mode:
-                    test["currentIteration"] += 1
-                    if test["currentIteration"] == test["totIterations"]:
-                        test_to_be_removed_name = test["appName"]
-                        new_data = [
-                            p
-                            for p in data["tests"]
-                            if p["appName"] != test_to_be_removed_name
-                        ]
-                        update_list_of_tests = True
-
-                end_time = time.time()
-                duration = end_time - start_time
-
-                test_duration_report[test_iteration].append(
-                    {"name": test["appName"], "duration": duration}
+        if pipeline_depth > 0 and data["target"]["type"] != "fpga":
+            rich.print(
+                "[yellow]WARNING[/yellow]: the pipelined campaign is only supported on FPGA targets, use --jobs on simulation targets"
+            )
+            pipeline_depth = 0
+
+        try:
+            if sweep_mode:
+                test_duration_report = run_util._run_sweep_campaign(
+                    testEnv, data, jobs, pipeline_depth, progress, task_message
                 )
+            else:
+                test_duration_report = run_util._run_campaign(
+                    testEnv, data, False, jobs, pipeline_depth, progress, task_message
+                )
+        except KeyboardInterrupt:
+            rich.print(" - [bold red]Campaign interrupted![/bold red]")
+            test_duration_report = None
+        finally:
+            testEnv.save_cache_stats()
 
-            if update_list_of_tests:
-                data["tests"] = new_data
+        if test_duration_report is None:
+            rich.print(
+                "[yellow]WARNING[/yellow]: the completed tests are saved, run 'testit run --resume' to continue the campaign"
+            )
+            exit(1)
+
+        # Durations of the tests completed before the campaign was interrupted
+        for iteration, tests in test_duration_report.items():
+            previous_durations.setdefault(iteration, []).extend(tests)
+        test_duration_report = dict(sorted(previous_durations.items()))
 
         if data["target"]["type"] == "fpga":
+            # Debugger sessions are restarted only when their health probe fails
+            board_health = {}
+            for fpga_board in testEnv.boards:
+                board_health[fpga_board.name] = fpga_board.health()
+                rich.print(
+                    f" - FPGA board {fpga_board.name}: {fpga_board.tests_run} tests, {fpga_board.tests_failed} failed, {fpga_board.restarts} debugger restarts"
+                )
+            os.makedirs(data["report"]["dir"], exist_ok=True)
+            with open(
+                os.path.join(data["report"]["dir"], "board_health.json"), "w"
+            ) as f:
+                json.dump(board_health, f, indent=2)
+
             testEnv.stop_deb()
 
         # Output the time duration of the tests
@@ -374,3 +368,42 @@ def testit_report(sort_key, ascending):
     testEnv = testit.TestItEnv(data)
 
     testEnv.gen_report(sort_key, ascending)
+
+
+# Shows statistics of the TestIt cache, or clears it
+def testit_cache(action):
+    # Load the configuration file
+    data = run_util._load_config()
+    if data is None:
+        rich.print("[bold red]ERROR: config.test not found![/bold red]")
+        exit(1)
+
+    cache_cfg = data.get("cache", {})
+    stores = [
+        cache.DiskCache(
+            cache_cfg.get("dir", cache.DEFAULT_CACHE_DIR),
+            name,
+            cache_cfg.get("maxSize", cache.DEFAULT_MAX_SIZE_MB),
+        )
+        for name in cache.CACHE_NAMES
+    ]
+
+    if action == "clear":
+        for store in stores:
+            store.clear()
+        rich.print("TestIt cache [bold green][CLEARED][/bold green]")
+        return
+
+    table = Table(title="TestIt cache")
+    for column in ["Cache", "Entries", "Size (MB)", "Hits", "Misses"]:
+        table.add_column(column, style="cyan")
+    for name, store in zip(cache.CACHE_NAMES, stores):
+        stats = store.stats()
+        table.add_row(
+            name,
+            str(stats["entries"]),
+            f"{stats['size'] / (1024 * 1024):.1f} / {stats['maxSize'] / (1024 * 1024):.0f}",
+            str(stats["hits"]),
+            str(stats["misses"]),
+        )
+    rich.print(table)
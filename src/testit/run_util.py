@@ -13,19 +13,32 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <https://www.gnu.org/licenses/>.
 
+import concurrent.futures
 import hjson
 import os
+import queue
+import random
 import re
 import importlib_resources as resources
 import shutil
 import time
 import subprocess
 import threading
+import traceback
 import rich
 
+from . import datasets
+from . import result_parser
+from . import sweep
+from . import testit_util
+
 # Set this to True to enable debugging prints
 DEBUG_MODE = False  # TODO: REMOVE THIS LINE BEFORE RELEASE
 
+# Seconds a board of the farm waits before taking work again, after it handed back the
+# retry of a test that failed on it
+RETRY_HANDBACK_DELAY = 0.1
+
 
 # Redefine print() to be enabled only during debugging
 def _PRINT(*args, **kwargs):
@@ -92,19 +105,68 @@ def _update_time_estimation(progress, task_id):
         time.sleep(0.2)  # Adjust this to control the update frequency
 
 
-def _configuration_check(configuration, sweep_mode):
+def _configuration_check(configuration, sweep_mode, pipeline_mode=False):
     if configuration["target"]["type"] not in ["sim", "fpga"]:
         rich.print("   [bold red]ERROR: Invalid target type![/bold red]")
         rich.print(f"   {configuration['target']['type']} is neither 'sim' nor 'fpga'")
         return False
 
-    if configuration["target"]["type"] == "fpga" and (
-        configuration["target"]["usbPort"] == ""
-        or configuration["target"]["baudrate"] == ""
+    if configuration["target"]["type"] == "fpga" and any(
+        board_cfg.get("backend", "make") != "fake"
+        and (
+            board_cfg.get("usbPort", configuration["target"].get("usbPort", "")) == ""
+            or board_cfg.get("baudrate", configuration["target"].get("baudrate", ""))
+            == ""
+        )
+        for board_cfg in configuration["target"].get("boards") or [{}]
     ):
         rich.print("   [bold red]ERROR: invalid usbPort and/or baudrate![/bold red]")
         return False
 
+    if (
+        configuration["target"]["type"] == "fpga"
+        and len(configuration["target"].get("boards", [])) > 1
+        and "elf" not in configuration["target"]
+    ):
+        rich.print(
+            "   [bold red]ERROR: a farm of FPGA boards requires the 'elf' path of the target![/bold red]"
+        )
+        return False
+
+    if configuration["target"].get("duplicateRuns", "off") not in (
+        "collapse",
+        "repeat",
+        "off",
+    ):
+        rich.print(
+            "   [bold red]ERROR: 'duplicateRuns' must be 'collapse', 'repeat' or 'off'![/bold red]"
+        )
+        return False
+
+    seed = configuration["target"].get("seed")
+    if seed is not None and (
+        not isinstance(seed, int) or isinstance(seed, bool) or seed < 0
+    ):
+        rich.print(
+            "   [bold red]ERROR: the 'seed' of the target must be a non-negative integer![/bold red]"
+        )
+        return False
+
+    for test in configuration["tests"]:
+        for tag, tag_type in test.get("outputTypes", {}).items():
+            if tag_type not in result_parser.TAG_TYPES:
+                rich.print(
+                    f"   [bold red]ERROR: invalid type '{tag_type}' of output tag {tag}![/bold red]"
+                )
+                rich.print(f"   Supported types: {', '.join(result_parser.TAG_TYPES)}")
+                return False
+
+    if pipeline_mode and "elf" not in configuration["target"]:
+        rich.print(
+            "   [bold red]ERROR: the pipelined campaign requires the 'elf' path of the target![/bold red]"
+        )
+        return False
+
     if sweep_mode:
         for test in configuration["tests"]:
             if not any(
@@ -121,24 +183,726 @@ def _configuration_check(configuration, sweep_mode):
                             "   [bold red]ERROR: with sweep mode, each parameter requires a 'step' parameter to be defined as an integer![/bold red]"
                         )
                         return False
+            error = sweep.check_config(test)
+            if error is not None:
+                rich.print(f"   [bold red]ERROR: {error}![/bold red]")
+                return False
 
     return True
 
 
-# Returns all the possible combinations of tests
-def _get_tot_sweep_iterations(data):
-    sweep_parameters = []
-    for test in data["tests"]:
-        tot = 1
-        for parameter in test["parameters"]:
-            if isinstance(parameter["value"], list):
-                tot *= (
-                    int(
-                        abs(parameter["value"][0] - parameter["value"][1])
-                        / parameter["step"]
+# Returns the ordered list of (iteration, test) pairs that the campaign will run. In sweep
+# mode, these are the points of the current round of each test, picked by its strategy.
+# When a campaign is resumed, the iterations it already completed are skipped.
+def _get_campaign_plan(data, sweep_mode):
+    if not sweep_mode:
+        plan = [
+            (iteration, test)
+            for iteration in range(data["target"]["iterations"])
+            for test in data["tests"]
+        ]
+    else:
+        plan = sorted(
+            (
+                (iteration, test)
+                for test in data["tests"]
+                for iteration in test["sweepRound"]
+            ),
+            key=lambda item: item[0],
+        )
+
+    return plan
+
+
+# Whether a run was completed before the campaign was resumed
+def _is_completed(test, iteration):
+    return iteration in test.get("completedIterations", ())
+
+
+# Appends results to the report in plan order, whatever the order the tests complete in
+class _OrderedReport:
+    def __init__(self, test_env, plan):
+        self.test_env = test_env
+        self.plan = plan
+        self.completed = {}
+        self.next_index = 0
+        self.test_duration_report = {}
+
+    def add(self, index, results, duration):
+        self.completed[index] = (results, duration)
+
+        # Flush every result that is now contiguous with the already written ones
+        while self.next_index in self.completed:
+            results, duration = self.completed.pop(self.next_index)
+            iteration, test = self.plan[self.next_index]
+            self.test_env.report_results(test["appName"], iteration, results)
+            self.test_duration_report.setdefault(iteration, []).append(
+                {"name": test["appName"], "duration": duration}
+            )
+            self.test_env.checkpoint.add(test, iteration, duration)
+            self.next_index += 1
+
+
+# Runs the campaign plan on a pool of simulation workers, each one owning a scratch directory.
+# Results are appended to the report in plan order, regardless of the completion order.
+def _run_parallel_campaign(test_env, data, plan, sweep_mode, jobs, progress, task):
+    workers_dir = os.path.join(data["report"]["dir"], ".testit_workers")
+
+    free_slots = queue.Queue()
+    for slot in range(jobs):
+        os.makedirs(os.path.join(workers_dir, f"worker{slot}"), exist_ok=True)
+        free_slots.put(slot)
+
+    def run_job(iteration, test):
+        slot = free_slots.get()
+        try:
+            start_time = time.time()
+            try:
+                results = test_env.launch_sim_worker(
+                    test,
+                    iteration,
+                    os.path.join(workers_dir, f"worker{slot}"),
+                    sweep_mode,
+                )
+            # Like a failed stage, an error of the worker fails this test only
+            except Exception as e:
+                failure = testit_util.TestFailure(
+                    "run", f"raised {e!r}", traceback.format_exc().splitlines(True)
+                )
+                rich.print(
+                    f" - [yellow]WARNING[/yellow]: Test {test['appName']} {failure}"
+                )
+                results = testit_util.failure_results(
+                    data["report"]["dir"],
+                    test["appName"],
+                    iteration,
+                    test["outputTags"],
+                    failure,
+                )
+            return results, time.time() - start_time
+        finally:
+            free_slots.put(slot)
+
+    report = _OrderedReport(test_env, plan)
+    completed = 0
+    failed_test = None
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+    futures = {
+        executor.submit(run_job, iteration, test): index
+        for index, (iteration, test) in enumerate(plan)
+    }
+    progress.start_task(task)
+
+    try:
+        for future in concurrent.futures.as_completed(futures):
+            index = futures[future]
+            iteration, test = plan[index]
+            results, duration = future.result()
+
+            if results is None:
+                failed_test = test["appName"]
+                for pending in futures:
+                    pending.cancel()
+                break
+
+            report.add(index, results, duration)
+            completed += 1
+            progress.update(
+                task,
+                advance=1,
+                description=f" - [cyan]{completed}/{len(plan)}: {test['appName']}",
+                refresh=True,
+            )
+    except BaseException:
+        # Drop the queued jobs instead of running them with nobody recording their results
+        for pending in futures:
+            pending.cancel()
+        executor.shutdown(wait=False)
+        raise
+    executor.shutdown(wait=True)
+
+    shutil.rmtree(workers_dir, ignore_errors=True)
+
+    if failed_test is not None:
+        rich.print(
+            f" - [bold red]ERROR: Dataset generation of test {failed_test} failed![/bold red]"
+        )
+        return None
+
+    return report.test_duration_report
+
+
+# Runs the campaign plan on the FPGA board while a producer thread generates the datasets and
+# compiles the next tests. Compiled images are staged in a bounded queue of `depth` entries.
+def _run_pipelined_campaign(test_env, data, plan, sweep_mode, depth, progress, task):
+    staging_dir = os.path.join(data["report"]["dir"], ".testit_staging")
+    os.makedirs(staging_dir, exist_ok=True)
+
+    # One staged image is running, `depth` are queued and one is being produced
+    num_slots = depth + 2
+    stages = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    # Waits for a free stage, unless the consumer is gone
+    def stage(item):
+        while not stop.is_set():
+            try:
+                stages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        for index, (iteration, test) in enumerate(plan):
+            if stop.is_set():
+                return
+            elf = None
+            try:
+                if test_env.gen_test_datasets(
+                    test, sweep_mode, iteration
+                ) and test_env.compile_fpga_app(
+                    test["appName"], test_env.get_timeouts(test["appName"])["compile"]
+                ):
+                    elf = os.path.join(staging_dir, f"slot{index % num_slots}.elf")
+                    shutil.copy2(test_env.get_elf_path(test["appName"]), elf)
+            # A compilation that failed or timed out is recorded by the consumer
+            except testit_util.TestFailure as e:
+                elf = e
+            # Anything else stops the campaign, which must not wait for this stage
+            except Exception as e:
+                rich.print(
+                    f" - [bold red]ERROR: Staging of test {test['appName']} failed: {e}[/bold red]"
+                )
+                elf = None
+            if not stage((index, elf)) or elf is None:
+                return
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    progress.start_task(task)
+
+    try:
+        return _consume_stages(test_env, data, plan, stages, progress, task)
+    finally:
+        # Stop the producer if the consumer returned early, then drop the staged images
+        stop.set()
+        producer.join()
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+# Runs the staged images on the FPGA board, in plan order
+def _consume_stages(test_env, data, plan, stages, progress, task):
+    test_duration_report = {}
+
+    for _ in plan:
+        index, elf = stages.get()
+        iteration, test = plan[index]
+
+        if elf is None:
+            rich.print(
+                f" - [bold red]ERROR: Dataset generation or compilation of test {test['appName']} failed![/bold red]"
+            )
+            return None
+
+        start_time = time.time()
+        if isinstance(elf, testit_util.TestFailure):
+            rich.print(f" - [yellow]WARNING[/yellow]: Test {test['appName']} {elf}")
+            test_env.report_results(
+                test["appName"],
+                iteration,
+                testit_util.failure_results(
+                    data["report"]["dir"],
+                    test["appName"],
+                    iteration,
+                    test["outputTags"],
+                    elf,
+                ),
+            )
+        elif not test_env.launch_test(
+            app_name=test["appName"],
+            iteration=iteration,
+            pattern=rf"{test['outputFormat']}",
+            output_tags=test["outputTags"],
+            output_types=test.get("outputTypes"),
+            timeout_t=1000,
+            elf=elf,
+        ):
+            rich.print(
+                f" - [bold red]ERROR: Test {test['appName']} failed because of GDB timeout[/bold red]"
+            )
+            return None
+
+        progress.update(
+            task,
+            advance=1,
+            description=f" - [cyan]{index + 1}/{len(plan)}: {test['appName']}",
+            refresh=True,
+        )
+        duration = time.time() - start_time
+        test_duration_report.setdefault(iteration, []).append(
+            {"name": test["appName"], "duration": duration}
+        )
+        test_env.checkpoint.add(test, iteration, duration)
+
+    return test_duration_report
+
+
+# Runs the campaign plan on a farm of FPGA boards: every board takes the next test as soon as
+# it is idle. A test that fails on a board is retried on the farm, and a board that keeps
+# failing is removed from it.
+def _run_farm_campaign(test_env, data, plan, sweep_mode, progress, task):
+    staging_dir = os.path.join(data["report"]["dir"], ".testit_staging")
+    os.makedirs(staging_dir, exist_ok=True)
+    max_attempts = data["target"].get("maxAttempts", 3)
+    max_board_failures = data["target"].get("maxBoardFailures", 2)
+
+    work = queue.Queue()
+    # Work items are (plan index, attempts, name of the board the last attempt failed on)
+    for index in range(len(plan)):
+        work.put((index, 0, None))
+    events = queue.Queue()
+    build_lock = threading.Lock()
+    stop = threading.Event()
+
+    # A failed or hung test is recorded as such, and the farm moves on
+    def failed(index, test, error, fpga_board, start_time):
+        rich.print(f" - [yellow]WARNING[/yellow]: Test {test['appName']} {error}")
+        results = testit_util.failure_results(
+            data["report"]["dir"],
+            test["appName"],
+            plan[index][0],
+            test["outputTags"],
+            error,
+        )
+        events.put(("done", index, (results, time.time() - start_time, fpga_board)))
+
+    # Anything but a failed test stops the campaign, which must not wait for this board
+    def serve(fpga_board):
+        try:
+            serve_tests(fpga_board)
+        except Exception as e:
+            stop.set()
+            events.put(("error", None, f"FPGA board {fpga_board.name} stopped: {e}"))
+
+    def serve_tests(fpga_board):
+        elf = os.path.join(staging_dir, f"{fpga_board.name}.elf")
+
+        while True:
+            item = work.get()
+            if item is None or stop.is_set():
+                return
+            index, attempts, failed_on = item
+
+            # A retry goes to another board, unless this one is the only one left
+            if failed_on == fpga_board.name and any(
+                other is not fpga_board for other in test_env.healthy_boards()
+            ):
+                work.put(item)
+                if stop.wait(RETRY_HANDBACK_DELAY):
+                    return
+                continue
+
+            iteration, test = plan[index]
+            timeouts = test_env.get_timeouts(test["appName"], 1000)
+
+            # Test directories and build outputs are shared: build one test at a time
+            start_time = time.time()
+            try:
+                with build_lock:
+                    if stop.is_set():
+                        return
+                    built = test_env.gen_test_datasets(
+                        test, sweep_mode, iteration
+                    ) and test_env.compile_fpga_app(
+                        test["appName"], timeouts["compile"]
+                    )
+                    if built:
+                        shutil.copy2(test_env.get_elf_path(test["appName"]), elf)
+            except testit_util.TestFailure as e:
+                failed(index, test, e, fpga_board, start_time)
+                continue
+            if not built:
+                stop.set()
+                events.put(
+                    (
+                        "error",
+                        index,
+                        f"Dataset generation or compilation of test {test['appName']} failed",
                     )
-                    + 1
                 )
-        sweep_parameters.append(tot)
+                return
+
+            start_time = time.time()
+            try:
+                output_lines = fpga_board.run_test(
+                    elf, timeouts["load"], timeouts["run"]
+                )
+            except testit_util.TestFailure as e:
+                failed(index, test, e, fpga_board, start_time)
+                continue
+
+            if output_lines is None:
+                fpga_board.failures += 1
+                if attempts + 1 < max_attempts:
+                    work.put((index, attempts + 1, fpga_board.name))
+                else:
+                    error = testit_util.TestFailure(
+                        fpga_board.failed_stage, f"failed {max_attempts} times"
+                    )
+                    failed(index, test, error, fpga_board, start_time)
+
+                if (
+                    fpga_board.failures >= max_board_failures
+                    or not fpga_board.ensure_session()
+                ):
+                    fpga_board.healthy = False
+                    events.put(("dead", index, fpga_board))
+                    return
+                continue
+
+            fpga_board.failures = 0
+            results = test_env.parse_output(
+                output_lines,
+                rf"{test['outputFormat']}",
+                test["outputTags"],
+                test.get("outputTypes"),
+            )
+            events.put(("done", index, (results, time.time() - start_time, fpga_board)))
+
+    threads = [
+        threading.Thread(target=serve, args=(fpga_board,), daemon=True)
+        for fpga_board in test_env.healthy_boards()
+    ]
+    for thread in threads:
+        thread.start()
+    progress.start_task(task)
+
+    try:
+        return _collect_farm_events(
+            test_env, plan, events, len(threads), progress, task
+        )
+    finally:
+        # Keep the boards from taking more work if the campaign ended early
+        stop.set()
+        while True:
+            try:
+                work.get_nowait()
+            except queue.Empty:
+                break
+        for _ in threads:
+            work.put(None)
+        for thread in threads:
+            thread.join()
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+# Records the results the boards of the farm send back, in plan order
+def _collect_farm_events(test_env, plan, events, alive_boards, progress, task):
+    report = _OrderedReport(test_env, plan)
+    completed = 0
+
+    while completed < len(plan):
+        kind, index, payload = events.get()
+
+        if kind == "error":
+            rich.print(f" - [bold red]ERROR: {payload}![/bold red]")
+            return None
+
+        if kind == "dead":
+            alive_boards -= 1
+            rich.print(
+                f" - [yellow]WARNING[/yellow]: FPGA board {payload.name} removed from the farm after {payload.failures} failures"
+            )
+            if alive_boards == 0:
+                rich.print(" - [bold red]ERROR: every FPGA board failed![/bold red]")
+                return None
+            continue
+
+        results, duration, fpga_board = payload
+        report.add(index, results, duration)
+        completed += 1
+        progress.update(
+            task,
+            advance=1,
+            description=f" - [cyan]{completed}/{len(plan)}: {plan[index][1]['appName']} on {fpga_board.name}",
+            refresh=True,
+        )
+
+    return report.test_duration_report
+
+
+# Runs the campaign plan one test at a time, on the only target
+def _run_sequential_campaign(test_env, plan, sweep_mode, progress, task):
+    progress.start_task(task)
+
+    test_duration_report = {}
+
+    for index, (iteration, test) in enumerate(plan):
+        # Generate the datasets of this test only, right before launching it
+        if not test_env.gen_test_datasets(test, sweep_mode, iteration):
+            rich.print(" - [bold red]ERROR: Dataset generation failed![/bold red]")
+            return None
+
+        start_time = time.time()
+
+        if not test_env.launch_test(
+            app_name=test["appName"],
+            iteration=iteration,
+            pattern=rf"{test['outputFormat']}",
+            output_tags=test["outputTags"],
+            output_types=test.get("outputTypes"),
+            timeout_t=1000,
+        ):
+            rich.print(
+                f" - [bold red]ERROR: Test {test['appName']} failed because of GDB timeout[/bold red]"
+            )
+            return None
+
+        progress.update(
+            task,
+            advance=1,
+            description=f" - [cyan]{index + 1}/{len(plan)}: {test['appName']}",
+            refresh=True,
+        )
+        duration = time.time() - start_time
+        test_duration_report.setdefault(iteration, []).append(
+            {"name": test["appName"], "duration": duration}
+        )
+        test_env.checkpoint.add(test, iteration, duration)
+
+    return test_duration_report
+
+
+# Runs the campaign plan on the farm, the pipeline, the pool of simulation workers or one
+# test at a time, and returns the duration of each test, or None if the campaign failed
+def _run_campaign(test_env, data, sweep_mode, jobs, pipeline_depth, progress, message):
+    plan, duplicates = _deduplicate_plan(
+        test_env,
+        _get_campaign_plan(data, sweep_mode),
+        sweep_mode,
+        data["target"].get("duplicateRuns", "off"),
+    )
+    task = progress.add_task(message, total=len(plan), start=False)
 
-    return sweep_parameters
+    if data["target"]["type"] == "fpga" and len(test_env.boards) > 1:
+        test_duration_report = _run_farm_campaign(
+            test_env, data, plan, sweep_mode, progress, task
+        )
+    elif pipeline_depth > 0:
+        test_duration_report = _run_pipelined_campaign(
+            test_env, data, plan, sweep_mode, pipeline_depth, progress, task
+        )
+    elif jobs > 1:
+        test_duration_report = _run_parallel_campaign(
+            test_env, data, plan, sweep_mode, jobs, progress, task
+        )
+    else:
+        test_duration_report = _run_sequential_campaign(
+            test_env, plan, sweep_mode, progress, task
+        )
+
+    progress.remove_task(task)
+
+    if test_duration_report is not None and duplicates:
+        _fan_out_duplicates(test_env, data, duplicates, test_duration_report)
+    return test_duration_report
+
+
+# Finds the runs of the plan whose generated files would be identical to the ones of an
+# earlier run of the same test, e.g. the same sweep point of a test without input datasets.
+# With the "collapse" policy, duplicates are left out of the plan and get the results of
+# their original run. With "repeat", they still run, as deliberate repeats of the original.
+# Only tests whose datasets come from deterministic generators are fingerprinted: random
+# datasets never collide, and drawing them twice would waste the time they take.
+# The whole plan is fingerprinted, so that a run completed before the campaign was resumed
+# is still the original of its duplicates, but completed runs are left out of both lists.
+# Returns the plan to run and the (iteration, test, original iteration) of the duplicates.
+def _deduplicate_plan(test_env, plan, sweep_mode, policy):
+    if policy == "off":
+        return [
+            (iteration, test)
+            for iteration, test in plan
+            if not _is_completed(test, iteration)
+        ], []
+
+    deterministic = {}
+    originals = {}
+    unique_plan = []
+    duplicates = []
+    for iteration, test in plan:
+        if test["appName"] not in deterministic:
+            input_datasets = test.get("inputDataset", [])
+            if isinstance(input_datasets, dict):
+                input_datasets = [input_datasets]
+            deterministic[test["appName"]] = all(
+                datasets.is_deterministic(dataset) for dataset in input_datasets
+            )
+        if not deterministic[test["appName"]]:
+            unique_plan.append((iteration, test))
+            continue
+
+        fingerprint = test_env.run_fingerprint(test, sweep_mode, iteration)
+        # Runs whose datasets can't be generated fail on their own
+        if fingerprint is None:
+            unique_plan.append((iteration, test))
+            continue
+
+        original = originals.setdefault((test["appName"], fingerprint), iteration)
+        if original == iteration:
+            unique_plan.append((iteration, test))
+        elif policy == "repeat":
+            test_env.run_tags[(test["appName"], iteration)] = {"repeatOf": original}
+            unique_plan.append((iteration, test))
+        else:
+            test_env.run_tags[(test["appName"], iteration)] = {"duplicateOf": original}
+            duplicates.append((iteration, test, original))
+
+    unique_plan = [
+        (iteration, test)
+        for iteration, test in unique_plan
+        if not _is_completed(test, iteration)
+    ]
+    duplicates = [
+        (iteration, test, original)
+        for iteration, test, original in duplicates
+        if not _is_completed(test, iteration)
+    ]
+    if duplicates:
+        rich.print(
+            f" - {len(duplicates)} duplicate runs collapsed into the run they duplicate"
+        )
+    return unique_plan, duplicates
+
+
+# Copies the results of the original runs to their duplicates
+def _fan_out_duplicates(test_env, data, duplicates, test_duration_report):
+    wanted = {(test["appName"], original) for _, test, original in duplicates}
+    original_results = {}
+    for test_name, entry in testit_util.iter_results(data["report"]["dir"]):
+        if (test_name, entry["iteration"]) in wanted:
+            result = {
+                tag: value
+                for tag, value in entry.items()
+                if tag not in ("iteration", "seed")
+            }
+            original_results.setdefault((test_name, entry["iteration"]), []).append(
+                result
+            )
+
+    for iteration, test, original in duplicates:
+        test_env.report_results(
+            test["appName"],
+            iteration,
+            original_results.get((test["appName"], original), []),
+        )
+        test_duration_report.setdefault(iteration, []).append(
+            {"name": test["appName"], "duration": 0.0}
+        )
+        test_env.checkpoint.add(test, iteration, 0.0)
+
+
+# Runs the sweep campaign in rounds: the strategy of each test picks the points of a round,
+# and sees the results of the round before picking the next one. Iterations keep counting
+# across rounds, so that every point has its own entries in the report.
+def _run_sweep_campaign(test_env, data, jobs, pipeline_depth, progress, message):
+    # The seed of the campaign picks the same points again when it's resumed or replayed
+    rng = random.Random(test_env.seed)
+    strategies = [sweep.get_strategy(test, rng) for test in data["tests"]]
+    round_results = [None] * len(strategies)
+    test_duration_report = {}
+
+    while True:
+        for index, test in enumerate(data["tests"]):
+            points = strategies[index].next_round(round_results[index])
+            sweep_points = test.setdefault("sweepPoints", [])
+            test["sweepRound"] = range(
+                len(sweep_points), len(sweep_points) + len(points)
+            )
+            sweep_points.extend(points)
+
+        if not any(test["sweepRound"] for test in data["tests"]):
+            break
+
+        durations = _run_campaign(
+            test_env, data, True, jobs, pipeline_depth, progress, message
+        )
+        if durations is None:
+            return None
+        for iteration, tests in durations.items():
+            test_duration_report.setdefault(iteration, []).extend(tests)
+
+        # Group the results of the round by point, failed tests included
+        database = testit_util._load_database(data["report"]["dir"])
+        for index, test in enumerate(data["tests"]):
+            results = {}
+            for entry in database.get(test["appName"], []):
+                results.setdefault(entry["iteration"], []).append(entry)
+            round_results[index] = [
+                results.get(iteration, []) for iteration in test["sweepRound"]
+            ]
+
+    for test, strategy in zip(data["tests"], strategies):
+        best = strategy.best()
+        if best is not None:
+            values, score = best
+            point = ", ".join(
+                f"{param['name']}={value}"
+                for param, value in zip(test["parameters"], values)
+            )
+            rich.print(
+                f" - Best point of test {test['appName']}: {point} ({test['sweep']['metric']} = {score:g})"
+            )
+
+    return test_duration_report
+
+
+# Generates again the datasets of a run of the last campaign from the seed recorded with its
+# results, and its sweep point in the checkpoint journal, to debug it on its exact inputs
+def _replay(test_env, data, sweep_mode, test_name, iteration):
+    test = next((test for test in data["tests"] if test["appName"] == test_name), None)
+    if test is None:
+        rich.print(f" - [bold red]ERROR: there is no test {test_name}![/bold red]")
+        return False
+
+    entry = next(
+        (
+            entry
+            for name, entry in testit_util.iter_results(data["report"]["dir"])
+            if name == test_name and entry["iteration"] == iteration
+        ),
+        None,
+    )
+    if entry is None or "seed" not in entry:
+        rich.print(
+            f" - [bold red]ERROR: no result of iteration {iteration} of test {test_name} records its seed![/bold red]"
+        )
+        return False
+    test_env.seed = entry["seed"]
+
+    if sweep_mode:
+        test_env.checkpoint.load()
+        point = next(
+            (
+                run["point"]
+                for run in test_env.checkpoint.runs
+                if run["test"] == test_name and run["iteration"] == iteration
+            ),
+            None,
+        )
+        if point is None:
+            rich.print(
+                f" - [bold red]ERROR: the checkpoint journal doesn't record the sweep point of iteration {iteration} of test {test_name}![/bold red]"
+            )
+            return False
+        test["sweepPoints"] = {iteration: point}
+
+    if not test_env.gen_test_datasets(test, sweep_mode, iteration):
+        rich.print(" - [bold red]ERROR: Dataset generation failed![/bold red]")
+        return False
+
+    rich.print(
+        f" - Datasets of iteration {iteration} of test {test_name} generated in {test['dir']} (seed {test_env.seed}) [bold green][OK][/bold green]"
+    )
+    return True
@@ -0,0 +1,250 @@
+# Copyright (C) 2025 Politecnico di Torino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Strategies of the sweep mode. A strategy picks the parameter points of a test one round
+# at a time: the whole grid of parameter combinations doesn't scale past a few swept
+# parameters, so the others cover the design space within a budget of test runs, and
+# can use the results of a round to choose the points of the next one.
+
+import math
+import random
+
+from . import testit_util
+
+
+def _axes(parameters):
+    """The values of each swept parameter, on the grid given by its step."""
+    return [
+        list(range(param["value"][0], param["value"][1] + 1, param["step"]))
+        for param in parameters
+        if isinstance(param["value"], list)
+    ]
+
+
+def grid_size(parameters):
+    """Returns the number of parameter combinations of the full grid."""
+    size = 1
+    for values in _axes(parameters):
+        size *= len(values)
+    return size
+
+
+def _point(parameters, swept_values):
+    """Completes the values of the swept parameters with the fixed ones."""
+    swept_values = iter(swept_values)
+    return [
+        next(swept_values) if isinstance(param["value"], list) else param["value"]
+        for param in parameters
+    ]
+
+
+def _latin_hypercube(axes, size, rng):
+    """Samples points so that each parameter range is split in as many strata as
+    points, and every stratum of every parameter holds one of them. An axis with fewer
+    values than points repeats them, so the points that come out twice are dropped."""
+    columns = []
+    for values in axes:
+        column = [
+            values[min(len(values) - 1, int((k + rng.random()) * len(values) / size))]
+            for k in range(size)
+        ]
+        rng.shuffle(column)
+        columns.append(column)
+
+    points = []
+    seen = set()
+    for values in zip(*columns):
+        if values not in seen:
+            seen.add(values)
+            points.append(list(values))
+    return points
+
+
+class SweepStrategy:
+    """Picks the parameter points of a test, one round at a time."""
+
+    def __init__(self, test, rng=random):
+        self.parameters = test["parameters"]
+        self.config = test.get("sweep", {})
+        self.rng = rng
+
+    def next_round(self, results):
+        """Picks the points of the next round.
+
+        Args:
+            results (list): For each point of the previous round, the list of its results,
+                or None before the first round.
+
+        Returns:
+            list: The parameter values of each point to test, empty once the sweep is over.
+        """
+        raise NotImplementedError
+
+    def best(self):
+        """Returns the best point found so far and its score, or None."""
+        return None
+
+
+class GridSweep(SweepStrategy):
+    """Tests every combination of the parameters."""
+
+    def next_round(self, results):
+        if results is not None:
+            return []
+        return [
+            testit_util.get_sweep_parameters(iteration, self.parameters)
+            for iteration in range(grid_size(self.parameters))
+        ]
+
+
+class RandomSweep(SweepStrategy):
+    """Tests "budget" combinations of the parameters, drawn at random from the grid."""
+
+    def next_round(self, results):
+        if results is not None:
+            return []
+        size = grid_size(self.parameters)
+        return [
+            testit_util.get_sweep_parameters(iteration, self.parameters)
+            for iteration in self.rng.sample(
+                range(size), min(self.config["budget"], size)
+            )
+        ]
+
+
+class LatinHypercubeSweep(SweepStrategy):
+    """Tests "budget" combinations of the parameters, spread over the range of each one."""
+
+    def next_round(self, results):
+        if results is not None:
+            return []
+        size = min(self.config["budget"], grid_size(self.parameters))
+        return [
+            _point(self.parameters, values)
+            for values in _latin_hypercube(_axes(self.parameters), size, self.rng)
+        ]
+
+
+class HalvingSweep(SweepStrategy):
+    """Successive halving: a Latin hypercube of points is tested once, then only the best
+    1/eta of the points, by the mean of the "metric" tag, are tested again with eta
+    times as many runs (with new datasets), until the best point is left. The number
+    of points is the largest one whose test runs fit in the "budget".
+    """
+
+    def __init__(self, test, rng=random):
+        super().__init__(test, rng)
+        self.metric = self.config["metric"]
+        self.maximize = self.config.get("goal", "min") == "max"
+        self.eta = self.config.get("eta", 2)
+
+        size = 1
+        while size < grid_size(self.parameters) and (
+            self._cost(size + 1) <= self.config["budget"]
+        ):
+            size += 1
+        self.points = _latin_hypercube(_axes(self.parameters), size, rng)
+        self.scores = [[] for _ in self.points]
+        self.survivors = list(range(len(self.points)))
+        self.runs = 1
+        self.last_round = []
+
+    def _cost(self, size):
+        """Number of test runs of a sweep starting from "size" points."""
+        cost, runs = size, 1
+        while size > 1 and size // self.eta > 1:
+            size //= self.eta
+            runs *= self.eta
+            cost += size * runs
+        return cost
+
+    def _score(self, results):
+        values = []
+        for result in results:
+            try:
+                values.append(float(result[self.metric]))
+            except (KeyError, TypeError, ValueError):
+                # Failed and timed out tests are the worst points
+                return math.inf
+        if not values:
+            return math.inf
+        score = sum(values) / len(values)
+        return -score if self.maximize else score
+
+    def _mean_score(self, point):
+        return sum(self.scores[point]) / len(self.scores[point])
+
+    def next_round(self, results):
+        if results is not None:
+            for point, point_results in zip(self.last_round, results):
+                self.scores[point].append(self._score(point_results))
+
+            self.survivors.sort(key=self._mean_score)
+            if len(self.survivors) // self.eta <= 1:
+                return []
+            self.survivors = self.survivors[: len(self.survivors) // self.eta]
+            self.runs *= self.eta
+
+        self.last_round = [point for point in self.survivors for _ in range(self.runs)]
+        return [
+            _point(self.parameters, self.points[point]) for point in self.last_round
+        ]
+
+    def best(self):
+        if not any(self.scores[point] for point in self.survivors):
+            return None
+        point = self.survivors[0]
+        score = self._mean_score(point)
+        return _point(self.parameters, self.points[point]), (
+            -score if self.maximize else score
+        )
+
+
+# Sweep strategies, by the "strategy" name of the "sweep" field of a test
+SWEEP_STRATEGIES = {
+    "grid": GridSweep,
+    "random": RandomSweep,
+    "lhs": LatinHypercubeSweep,
+    "halving": HalvingSweep,
+}
+
+
+def check_config(test):
+    """Checks the "sweep" field of a test.
+
+    Returns:
+        str: The description of the first issue, or None if the field is valid.
+    """
+    config = test.get("sweep", {})
+    strategy = config.get("strategy", "grid")
+    if strategy not in SWEEP_STRATEGIES:
+        return f"unknown sweep strategy '{strategy}' of test {test['appName']}"
+    if strategy != "grid" and (
+        not isinstance(config.get("budget"), int) or config["budget"] < 1
+    ):
+        return f"the {strategy} sweep of test {test['appName']} requires a positive integer 'budget'"
+    if strategy == "halving":
+        if config.get("metric") not in test["outputTags"]:
+            return f"the halving sweep of test {test['appName']} requires a 'metric' among its outputTags"
+        if config.get("goal", "min") not in ("min", "max"):
+            return f"the 'goal' of the sweep of test {test['appName']} must be 'min' or 'max'"
+        if not isinstance(config.get("eta", 2), int) or config.get("eta", 2) < 2:
+            return f"the 'eta' of the sweep of test {test['appName']} must be an integer of at least 2"
+    return None
+
+
+def get_strategy(test, rng=random):
+    """Returns the sweep strategy of a test, the full grid unless it has a "sweep" field."""
+    return SWEEP_STRATEGIES[test.get("sweep", {}).get("strategy", "grid")](test, rng)
@@ -0,0 +1,64 @@
+/*
+ * Binary result records of the TestIt serial protocol.
+ *
+ * Every record is made of a 2-byte sync word (0xA5 0x5A), a 1-byte type, a 2-byte
+ * little-endian payload length, the payload and the little-endian CRC-32 of the
+ * type, length and payload. The output of a test is a sequence of RESULT records,
+ * one field for each output tag, closed by an END record.
+ *
+ * The application must provide testit_putc(), which sends a byte on the serial port
+ * configured at TESTIT_BAUDRATE.
+ */
+
+#include <stddef.h>
+#include <stdint.h>
+
+#define TESTIT_SYNC0 0xA5
+#define TESTIT_SYNC1 0x5A
+#define TESTIT_RECORD_RESULT 0x01
+#define TESTIT_RECORD_END 0xFF
+
+void testit_putc(uint8_t c);
+
+static inline uint32_t testit_crc32(uint32_t crc, const uint8_t *data, size_t size)
+{
+    crc = ~crc;
+    while (size--) {
+        crc ^= *data++;
+        for (int bit = 0; bit < 8; bit++)
+            crc = (crc >> 1) ^ (0xEDB88320u & -(crc & 1u));
+    }
+    return ~crc;
+}
+
+static inline void testit_send_record(uint8_t type, const uint8_t *payload, uint16_t size)
+{
+    uint8_t header[3] = {type, (uint8_t)(size & 0xFF), (uint8_t)(size >> 8)};
+    uint32_t crc = testit_crc32(testit_crc32(0, header, 3), payload, size);
+
+    testit_putc(TESTIT_SYNC0);
+    testit_putc(TESTIT_SYNC1);
+    for (int i = 0; i < 3; i++)
+        testit_putc(header[i]);
+    for (uint16_t i = 0; i < size; i++)
+        testit_putc(payload[i]);
+    for (int i = 0; i < 4; i++)
+        testit_putc((uint8_t)(crc >> (8 * i)));
+}
+
+/* Sends a result: one value for each output tag, in the order of "outputTags" */
+static inline void testit_send_result(const int32_t fields[TESTIT_RESULT_FIELDS])
+{
+    uint8_t payload[4 * TESTIT_RESULT_FIELDS];
+
+    for (int i = 0; i < TESTIT_RESULT_FIELDS; i++)
+        for (int j = 0; j < 4; j++)
+            payload[4 * i + j] = (uint8_t)((uint32_t)fields[i] >> (8 * j));
+    testit_send_record(TESTIT_RECORD_RESULT, payload, sizeof(payload));
+}
+
+/* Marks the end of the test output */
+static inline void testit_end(void)
+{
+    testit_send_record(TESTIT_RECORD_END, NULL, 0);
+}
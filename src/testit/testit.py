@@ -13,22 +13,19 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <https://www.gnu.org/licenses/>.
 
-import copy
+import hashlib
 import json
 import os
-import sys
-import queue
-import random
-import re
-import subprocess
-import threading
-
-import numpy as np
-import pexpect
-import serial
+import shutil
+
+import rich
 from rich.console import Console
 from rich.table import Table
 
+from . import board
+from . import cache
+from . import datasets
+from . import result_parser
 from . import testit_util
 
 # Set this to True to enable debugging prints
@@ -43,28 +40,76 @@ def print_deb(*args, **kwargs):
         print(*args, **kwargs)
 
 
+def _sort_entries(entries, sort_key, ascending=True):
+    """Sorts report entries by a field: numbers first, compared as floats, then the other
+    values, e.g. FAILED, as text. Entries without the field come last in both orders."""
+    numbers, texts, missing = [], [], []
+    for entry in entries:
+        value = entry.get(sort_key)
+        if value is None:
+            missing.append(entry)
+            continue
+        try:
+            numbers.append((float(value), entry))
+        except (TypeError, ValueError):
+            texts.append((str(value), entry))
+
+    numbers.sort(key=lambda item: item[0], reverse=not ascending)
+    texts.sort(key=lambda item: item[0], reverse=not ascending)
+    return [entry for _, entry in numbers] + [entry for _, entry in texts] + missing
+
+
 class TestItEnv:
     """A class to define the environment for the verification campaign."""
 
     def __init__(self, config):
         self.cfg = config
-        self.serial_comm_instance = None
-        self.serial_comm_queue = None
-        self.serial_comm_thread = None
-        self.gdb = None
+        self.boards = board.get_boards(config)
         self.project_root = None
-        self.deb = None
+        self.build_cache = cache.BuildCache.from_config(config)
+        self.golden_cache = cache.GoldenCache.from_config(
+            config, os.path.join(os.getcwd(), "testit_golden.py")
+        )
+        self.baudrate = config["target"].get("baudrate")
+        self.binary_protocol = (
+            config["target"].get("serialProtocol", "text") == "binary"
+        )
+        self.error_rules = testit_util.ErrorRules(config["target"].get("errorRules"))
+        self.checkpoint = testit_util.Checkpoint(config["report"]["dir"])
+        self.seed = config["target"].get("seed")
+        self.run_tags = {}
+        # Test directory copied in each directory of the worker slots
+        self.worker_sources = {}
+
+    def save_cache_stats(self):
+        """Save the hit and miss counters of the caches, once per campaign."""
+        for store in (self.build_cache, self.golden_cache):
+            if store is not None:
+                store.save_counters()
 
     def reset_all(self):
         """Reset all the environment variables."""
-        if self.serial_comm_instance.is_open:
-            self.serial_comm_instance.close()
-        self.serial_comm_instance = None
-        self.serial_comm_queue = None
-        self.serial_comm_thread = None
-        self.gdb = None
+        for fpga_board in self.boards:
+            fpga_board.close()
+        self.boards = board.get_boards(self.cfg)
         self.project_root = None
 
+    def healthy_boards(self):
+        """Return the FPGA boards that are still usable.
+
+        Returns:
+            list: The healthy boards.
+        """
+        return [fpga_board for fpga_board in self.boards if fpga_board.healthy]
+
+    def _setup_boards(self, setup):
+        # A board that fails its set-up is left out of the campaign, as long as another one works
+        for fpga_board in self.healthy_boards():
+            if not setup(fpga_board):
+                print(f"ERROR: Set-up of FPGA board {fpga_board.name} failed")
+                fpga_board.healthy = False
+        return len(self.healthy_boards()) > 0
+
     def clear_results(self):
         """Clear the results of the last verification campaign."""
         testit_util.clear_database(self.cfg["report"]["dir"])
@@ -77,24 +122,16 @@ class TestItEnv:
         """
         if self.cfg["target"]["type"] == "fpga":
             cmd = f"make fpga-build board={self.cfg['target']['name']}"
-            build_result = subprocess.run(
-                cmd, shell=True, capture_output=True, text=True, check=False
-            )
-            if ("ERROR" in build_result.stdout) or ("Error" in build_result.stdout):
-                print(build_result.stdout)
-                return False
-            else:
-                return True
         else:
             cmd = f"make sim-build tool={self.cfg['target']['name']}"
-            build_result = subprocess.run(
-                cmd, shell=True, capture_output=True, text=True, check=False
-            )
-            if ("ERROR" in build_result.stdout) or ("Error" in build_result.stdout):
-                print(build_result.stdout)
-                return False
-            else:
-                return True
+
+        build_result = testit_util.stream_command(
+            cmd, stage="build", error_rule=self.error_rules.get("build")
+        )
+        if build_result.failure() is not None:
+            print("".join(build_result.log))
+            return False
+        return True
 
     def load_fpga_model(self):
         """Loads the FPGA model into the FPGA board.
@@ -102,92 +139,201 @@ class TestItEnv:
         Returns:
             bool: True if the model was successfully loaded, False otherwise.
         """
-        cmd = f"make fpga-load board={self.cfg['target']['name']}"
-        load_result = subprocess.run(
-            cmd, shell=True, capture_output=True, text=True, check=False
-        )
-        if ("ERROR" in load_result.stdout) or ("Error" in load_result.stdout):
-            print(load_result.stdout)
-            return False
+        for fpga_board in self.boards:
+            if fpga_board.backend == "fake":
+                continue
+            cmd = f"make fpga-load board={self.cfg['target']['name']}{fpga_board.make_args()}"
+            load_result = testit_util.stream_command(
+                cmd, stage="load", error_rule=self.error_rules.get("load")
+            )
+            if load_result.failure() is not None:
+                print("".join(load_result.log))
+                return False
         return True
 
     def serial_begin(self):
-        """Set-up serial communication with the FPGA board.
+        """Set-up serial communication with the FPGA boards.
 
         Returns:
             bool: True if the serial communication was successfully set-up, False otherwise
         """
-        try:
-            self.serial_comm_instance = serial.Serial(
-                f"/dev/ttyUSB{self.cfg['target']['usbPort']}",
-                self.cfg["target"]["baudrate"],
-                timeout=1,
-            )
-
-            if not self.serial_comm_instance.is_open:
-                return False
-        except Exception as e:
-            return False
-
-        self.serial_comm_queue = queue.Queue()
-
-        return True
+        return self._setup_boards(board.Board.serial_begin)
 
     def setup_deb(self):
-        """Set-up the debugger.
+        """Set-up the debugger of every FPGA board.
 
         Returns:
             bool: True if the debugger was successfully set-up, False otherwise.
-        """ """"""
-        deb_cmd = f"""
-        cd {os.getcwd()}
-        make deb-setup
         """
-        self.deb = pexpect.spawn(f"/bin/bash -c '{deb_cmd}'")
-        if self.deb.isalive():
-            return True
-        else:
-            print({self.deb.exitstatus})
-            return False
+        return self._setup_boards(board.Board.setup_deb)
 
     def setup_gdb(self):
-        """Set-up the GDB debugger.
+        """Set-up the GDB debugger of every FPGA board.
 
         Returns:
             bool: True if the GDB debugger was successfully set-up, False otherwise.
         """
-        gdb_cmd = f"""
-        cd {os.getcwd()}
-        make gdb-setup
-        """
-        self.gdb = pexpect.spawn(f"/bin/bash -c '{gdb_cmd}'")
-        self.gdb.sendline("set pagination off")
-        self.gdb.sendline("set confirm off")
-        self.gdb.expect("(gdb)")
-        self.gdb.sendline("set remotetimeout 2000")
-        self.gdb.expect("(gdb)")
-        self.gdb.sendline("target extended-remote localhost:3333")
-        self.gdb.expect("(gdb)")
-
-        if self.gdb.isalive():
-            print_deb("GDB process is still running.")
-            return True
-        print_deb("GDB process has terminated.")
-        if self.gdb.exitstatus is not None:
-            print(f"GDB exit status: {self.gdb.exitstatus}")
-        if self.gdb.signalstatus is not None:
-            print(f"GDB terminated by signal: {self.gdb.signalstatus}")
-        sys.exit(1)
+        return self._setup_boards(board.Board.setup_gdb)
 
     def stop_gdb(self):
         """Stop the GDB debugger."""
-        self.gdb.sendcontrol("c")
-        self.gdb.terminate()
+        for fpga_board in self.boards:
+            fpga_board.stop_gdb()
 
     def stop_deb(self):
         """Stop the debugger." """
-        self.deb.sendcontrol("c")
-        self.deb.terminate()
+        for fpga_board in self.boards:
+            fpga_board.stop_deb()
+
+    def compile_app(self, app_name, app_compile_cmd, app_dir=None, timeout=None):
+        """Compile a test application, or restore its artifacts from the build cache.
+
+        Args:
+            app_name (str): The name of the application to compile.
+            app_compile_cmd (str): The Make command that compiles the application.
+            app_dir (str, optional): The application directory, if not the test "dir". Defaults to None.
+            timeout (float, optional): Seconds the compilation can take. Defaults to None.
+
+        Raises:
+            testit_util.TestFailure: If the compilation failed, or didn't complete in time.
+
+        Returns:
+            bool: True once the application is compiled.
+        """
+        test = self.get_test(app_name)
+        if app_dir is None:
+            app_dir = test["dir"]
+
+        key = None
+        if self.build_cache is not None:
+            key = self.build_cache.key(
+                app_name, app_dir, app_compile_cmd, test["genFilesName"]
+            )
+            if self.build_cache.restore(key, app_name, app_dir):
+                print_deb("Build cache hit!")
+                return True
+
+        result_compilation = testit_util.stream_command(
+            app_compile_cmd,
+            timeout,
+            stage="compile",
+            error_rule=self.error_rules.get("compile"),
+        )
+        reason = result_compilation.failure()
+        if reason is not None:
+            raise testit_util.TestFailure("compile", reason, result_compilation.log)
+
+        print_deb("Compilation successful!")
+
+        if key is not None and not self.build_cache.store(key, app_name, app_dir):
+            print_deb("Build artifacts not found, build not cached")
+        return True
+
+    def load_golden(self):
+        """Load the golden module and check that it defines every golden function and dataset
+           generator of the campaign.
+
+        Returns:
+            bool: True if every golden function was found, False otherwise.
+        """
+        function_names = [
+            test["goldenResultFunction"]["name"]
+            for test in self.cfg.get("tests", [])
+            if test.get("outputDataset")
+        ]
+        generator_names = {
+            dataset.get("generator", "uniform")
+            for test in self.cfg.get("tests", [])
+            for dataset in (
+                [test["inputDataset"]]
+                if isinstance(test.get("inputDataset"), dict)
+                else test.get("inputDataset", [])
+            )
+        }
+
+        try:
+            missing = testit_util.get_golden_module().missing(function_names)
+            missing_generators = datasets.missing_generators(sorted(generator_names))
+        except Exception as e:
+            print(f"ERROR: {e}")
+            return False
+
+        for function_name in missing:
+            print(f"ERROR: Function {function_name} not found in testit_golden.py")
+        for generator_name in missing_generators:
+            print(
+                f"ERROR: Dataset generator {generator_name} is neither built-in nor in the DATASET_GENERATORS of testit_golden.py"
+            )
+        return not missing and not missing_generators
+
+    def gen_golden_results(self, function_name, input_arrays, parameters):
+        """Compute the reference values of a test, or load them from the golden cache.
+
+        Args:
+            function_name (str): The name of the golden function.
+            input_arrays (list): The input datasets of the test.
+            parameters (list): The parameters of the test, with their current values.
+
+        Returns:
+            list: The reference values, one array for each output dataset.
+        """
+        key = None
+        if self.golden_cache is not None:
+            key = self.golden_cache.key(function_name, input_arrays, parameters)
+            golden_results = self.golden_cache.load(key)
+            if golden_results is not None:
+                return golden_results
+
+        golden_function = testit_util.dyn_load_func(function_name)
+        golden_results = golden_function(input_arrays, parameters)
+
+        # Ensure golden_results is a list (it might be a single array)
+        if testit_util.is_numpy_array(golden_results):
+            golden_results = [golden_results]
+
+        if key is not None:
+            self.golden_cache.save(key, golden_results)
+        return golden_results
+
+    def get_elf_path(self, app_name):
+        """Return the path of the compiled image of a test application.
+
+        Args:
+            app_name (str): The name of the test application.
+
+        Returns:
+            str: The path of the image, as defined by the "elf" field of the target.
+        """
+        return self.cfg["target"]["elf"].format(
+            app=app_name, app_dir=self.get_test(app_name)["dir"]
+        )
+
+    def get_timeouts(self, app_name, timeout_t=0):
+        """Return the deadline of each stage of a test.
+
+        Args:
+            app_name (str): The name of the test application.
+            timeout_t (float, optional): Default deadline of the run stage. Defaults to 0, i.e. none.
+
+        Returns:
+            dict: The seconds each stage can take, or None if it has no deadline.
+        """
+        timeouts = dict(self.cfg["target"].get("timeouts", {}))
+        timeouts.update(self.get_test(app_name).get("timeouts", {}))
+        if timeout_t and "run" not in timeouts:
+            timeouts["run"] = timeout_t
+        return {stage: timeouts.get(stage) for stage in testit_util.TEST_STAGES}
+
+    def get_test(self, app_name):
+        """Return the configuration entry of a test.
+
+        Args:
+            app_name (str): The name of the test application.
+
+        Returns:
+            dict: The test entry of the configuration file.
+        """
+        return next(test for test in self.cfg["tests"] if test["appName"] == app_name)
 
     # Launch a test by compiling the target application and loading it into the FPGA flash via GDB
     def launch_test(
@@ -197,6 +343,8 @@ class TestItEnv:
         pattern=r"(\d+):(\d+):(\d+)",
         output_tags=None,
         timeout_t=0,
+        elf=None,
+        output_types=None,
     ):
         """Launch a test by compiling the target application and loading it into the FPGA flash via GDB.
 
@@ -205,158 +353,230 @@ class TestItEnv:
             iteration (int): The iteration of the test.
             pattern (str, optional): The pattern to match the output. Defaults to r"(\\d+):(\\d+):(\\d+)".
             output_tags (list, optional): The tags to use for the output. Defaults to None.
-            timeout_t (int, optional): The timeout for the test. Defaults to 0.
+            timeout_t (int, optional): The deadline of the run stage, in seconds, unless config.test
+                sets one. Defaults to 0, i.e. none.
+            elf (str, optional): An already compiled application image to load on the FPGA board,
+                in which case the compilation is skipped. Defaults to None.
+            output_types (dict, optional): The type of some output tags, e.g. {"Cycles": "hex"}. Defaults to None.
 
         Returns:
-            bool: True if the test was successful, False otherwise.
+            bool: True if the test was run, even if it failed or timed out, False if the
+                FPGA board didn't respond.
         """
         if output_tags is None:
             output_tags = ["ID", "Cycles", "Outcome"]
+        timeouts = self.get_timeouts(app_name, timeout_t)
 
-        # Test using the FPGA board
-        if self.cfg["target"]["type"] == "fpga":
-            # Check that the serial connection is still open
-            if not self.serial_comm_instance.is_open:
-                print("ERROR: Serial port is not open!")
-                exit(1)
-            self.serial_comm_thread = threading.Thread(
-                target=testit_util.serial_rx_setup,
-                args=(self.serial_comm_instance, self.serial_comm_queue),
-            )
+        try:
+            # Test using the FPGA board
+            if self.cfg["target"]["type"] == "fpga":
+                # Compile the application, unless a pre-compiled image is provided
+                if elf is None:
+                    if not self.compile_fpga_app(app_name, timeouts["compile"]):
+                        return False
+                    # Tell the board which image it loads, so it can skip unchanged sections
+                    if "elf" in self.cfg["target"]:
+                        elf = self.get_elf_path(app_name)
+
+                output_lines = self.run_fpga_test(elf, timeouts)
+                if output_lines is None:
+                    return False
+
+            # Test using the simulation tool
+            else:
+                output_lines = self.run_sim_test(app_name, timeouts=timeouts)
 
-            self.serial_comm_thread.start()
+            print_deb("Output lines:", output_lines)
 
-            # Compile the application
-            app_compile_cmd = (
-                f"make sw-fpga app={app_name} target={self.cfg['target']['name']}"
+            # Analyse the results of the test
+            output_matches = self.parse_output(
+                output_lines, pattern, output_tags, output_types
             )
-            result_compilation = subprocess.run(
-                app_compile_cmd, shell=True, capture_output=True, text=True, check=False
+
+        # A failed or hung test is recorded as such, and the campaign moves on
+        except testit_util.TestFailure as e:
+            rich.print(f" - [yellow]WARNING[/yellow]: Test {app_name} {e}")
+            output_matches = testit_util.failure_results(
+                self.cfg["report"]["dir"], app_name, iteration, output_tags, e
             )
 
-            if (
-                ("ERROR" in result_compilation.stdout)
-                or ("Error" in result_compilation.stdout)
-                or ("error" in result_compilation.stdout)
-                or ("ERROR" in result_compilation.stderr)
-                or ("Error" in result_compilation.stderr)
-                or ("error" in result_compilation.stderr)
-            ):
-                with open("testit_crash.log", "w", encoding="utf-8") as file:
-                    file.write(result_compilation.stdout)
-                    file.write(result_compilation.stderr)
-                return False
-            else:
-                print_deb("Compilation successful!")
-
-            # Reset the mcu
-            self.gdb.sendline("monitor reset halt")
-            self.gdb.expect("(gdb)")
-
-            # Run the testbench with gdb
-            self.gdb.sendline("load")
-            self.gdb.expect("(gdb)")
-
-            try:
-                output = self.gdb.read_nonblocking(size=100, timeout=1)
-                print_deb("Current gdb output:", output)
-            except pexpect.TIMEOUT:
-                print_deb("No new output from GDB.")
-                self.gdb.terminate()
-                return False
+        self.report_results(app_name, iteration, output_matches)
+        return True
+
+    def compile_fpga_app(self, app_name, timeout=None):
+        """Compile a test application for the FPGA board.
+
+        Args:
+            app_name (str): The name of the application to compile.
+            timeout (float, optional): Seconds the compilation can take. Defaults to None.
 
-            # Set a breakpoint at the exit and wait for it
-            self.gdb.sendline("b _exit")
-            self.gdb.expect("(gdb)")
-            self.gdb.sendline("continue")
-
-            exit_detected = False
-            while not exit_detected:
-                try:
-                    index = self.gdb.expect(
-                        [r"Breakpoint", pexpect.TIMEOUT], timeout=10
-                    )
-                    if index == 0:
-                        exit_detected = True
-                        print_deb("Program finished execution.")
-                except pexpect.exceptions.EOF:
-                    break
-
-            # Wait for serial to finish
-            self.serial_comm_thread.join()
-
-            output_lines = []
-            while not self.serial_comm_queue.empty():
-                output_lines.append(self.serial_comm_queue.get())
-
-        # Test using the simulation tool
+        Raises:
+            testit_util.TestFailure: If the compilation failed, or didn't complete in time.
+
+        Returns:
+            bool: True once the application is compiled.
+        """
+        app_compile_cmd = (
+            f"make sw-fpga app={app_name} target={self.cfg['target']['name']}"
+        )
+        return self.compile_app(app_name, app_compile_cmd, timeout=timeout)
+
+    def run_fpga_test(self, elf=None, timeouts=None):
+        """Load the compiled application on the first healthy FPGA board via GDB and run it.
+
+        Args:
+            elf (str, optional): The application image to load, instead of the one GDB was started with. Defaults to None.
+            timeouts (dict, optional): The deadlines of the test stages, see get_timeouts. Defaults to None.
+
+        Raises:
+            testit_util.StageTimeout: If the load or the run of the application didn't complete in time.
+
+        Returns:
+            list: The lines received from the serial port, or None if the test failed.
+        """
+        timeouts = timeouts or {}
+        return self.healthy_boards()[0].run_test(
+            elf, timeouts.get("load"), timeouts.get("run")
+        )
+
+    def run_sim_test(self, app_name, work_dir=None, output_file=None, timeouts=None):
+        """Compile the application and run it on the simulation model.
+
+        Args:
+            app_name (str): The name of the application to test.
+            work_dir (str, optional): Private copy of the application directory, passed to Make as "app_dir". Defaults to None.
+            output_file (str, optional): Private simulation dump, passed to Make as "output_file". Defaults to None.
+            timeouts (dict, optional): The deadlines of the test stages, see get_timeouts. Defaults to None.
+
+        Raises:
+            testit_util.TestFailure: If the compilation or the simulation failed, or didn't
+                complete in time.
+
+        Returns:
+            str: The path of the simulation output file.
+        """
+        timeouts = timeouts or {}
+        make_args = ""
+        if work_dir is not None:
+            make_args += f" app_dir={os.path.abspath(work_dir)}"
+
+        # Compile the application
+        app_compile_cmd = (
+            f"make sw-sim={self.cfg['target']['name']} app={app_name}{make_args}"
+        )
+        self.compile_app(app_name, app_compile_cmd, work_dir, timeouts.get("compile"))
+
+        if output_file is not None:
+            make_args += f" output_file={os.path.abspath(output_file)}"
         else:
-            # Compile the application
-            app_compile_cmd = f"make sw-sim={self.cfg['target']['name']} app={app_name}"
-            result_compilation = subprocess.run(app_compile_cmd, shell=True, capture_output=True, text=True)
-
-            if (
-                ("ERROR" in result_compilation.stdout)
-                or ("Error" in result_compilation.stdout)
-                or ("error" in result_compilation.stdout)
-                or ("ERROR" in result_compilation.stderr)
-                or ("Error" in result_compilation.stderr)
-                or ("error" in result_compilation.stderr)
-            ):
-                with open("testit_crash.log", "w") as file:
-                    file.write(result_compilation.stdout)
-                    file.write(result_compilation.stderr)
-                return False
+            output_file = self.cfg["target"]["outputFile"]
 
-            print_deb("Compilation successful!")
+        # The output of a previous test must not be taken for the one of this test
+        if os.path.isfile(output_file):
+            os.remove(output_file)
 
-            # Launch the simulation test
-            sim_cmd = f"make sim-run app={app_name}"
-            result_sim = subprocess.run(
-                sim_cmd, shell=True, capture_output=True, text=True, check=False
-            )
+        # Launch the simulation test, and stop it as soon as its output is complete
+        if self.binary_protocol:
+            endword = testit_util.encode_record(testit_util.RECORD_END)
+        else:
+            endword = b"&"
+        sim_cmd = f"make sim-run app={app_name}{make_args}"
+        result_sim = testit_util.stream_command(
+            sim_cmd,
+            timeouts.get("run"),
+            output_file=output_file,
+            endword=endword,
+            error_rule=self.error_rules.get("run"),
+        )
 
-            if (
-                ("ERROR" in result_sim.stdout)
-                or ("Error" in result_sim.stdout)
-                or ("error" in result_sim.stdout)
-                or ("ERROR" in result_sim.stderr)
-                or ("Error" in result_sim.stderr)
-                or ("error" in result_sim.stderr)
-            ):
-                with open("testit_crash.log", "w") as file:
-                    file.write(result_sim.stdout)
-                    file.write(result_sim.stderr)
-                return False
+        reason = result_sim.failure()
+        if reason is None and not os.path.isfile(output_file):
+            reason = f"wrote no output file {output_file}"
+        if reason is not None:
+            raise testit_util.TestFailure("run", reason, result_sim.log)
 
-            print_deb("Simulation successful!")
+        print_deb("Simulation successful!")
 
-            # Read the output file
-            try:
-                with open(self.cfg["target"]["outputFile"], "r", encoding="utf-8") as f:
-                    output_lines = f.readlines()
-            except FileNotFoundError:
-                return False
+        # The output file is parsed as it's read, instead of being loaded at once
+        return output_file
 
-        print_deb("Output lines:", output_lines)
+    def parse_output(self, output_lines, pattern, output_tags, output_types=None):
+        """Extract the results of a test from its output lines.
 
-        # Analyse the results of the test
-        output_matches = []
-        pattern = re.compile(pattern)
-        for line in output_lines:
-            match = pattern.search(line)
-            if match:
+        Args:
+            output_lines (list): The lines printed by the test application, the bytes it
+                sent if the binary serial protocol is used, or the path of the simulation
+                output file.
+            pattern (str): The regex that matches a result line.
+            output_tags (list): The tags associated to the regex groups.
+            output_types (dict, optional): The type of some output tags, e.g. {"Cycles": "hex"}. Defaults to None.
 
-                matched_data = match.groups()
-                result_dict = {
-                    output_tags[i]: matched_data[i] for i in range(len(matched_data))
-                }
-                output_matches.append(result_dict)
+        Returns:
+            list: A dictionary of tagged values for each matching line.
+        """
+        parser = result_parser.get_parser(pattern, output_tags, output_types)
+        if isinstance(output_lines, str):
+            return parser.parse_file(output_lines, self.binary_protocol)
+        if isinstance(output_lines, (bytes, bytearray)):
+            return parser.parse_records(output_lines)
+        return parser.parse_lines(output_lines)
+
+    def launch_sim_worker(self, test, iteration, worker_dir, sweep_mode=False):
+        """Generate the datasets of a test and run it in a private scratch directory.
+           Used by the parallel campaign: nothing is written to the report here, the
+           caller merges the returned results in a stable order. The test directory is
+           copied in the scratch directory the first time the worker runs the test.
 
-        testit_util.append_results_to_report(
-            self.cfg["report"]["dir"], app_name, iteration, output_matches
+        Args:
+            test (dict): The test entry of the configuration file.
+            iteration (int): The iteration of the test.
+            worker_dir (str): The scratch directory owned by the worker.
+            sweep_mode (bool, optional): If True, parameters are picked from the sweep space. Defaults to False.
+
+        Returns:
+            list: The results of the test, or None if its datasets couldn't be generated.
+        """
+        app_dir = os.path.join(
+            worker_dir, os.path.basename(os.path.normpath(test["dir"]))
+        )
+        # The sources are copied once per slot, then each job only rewrites the
+        # generated files, and the build of the previous job is reused
+        source_dir = os.path.abspath(test["dir"])
+        if self.worker_sources.get(app_dir) != source_dir:
+            if os.path.exists(app_dir):
+                shutil.rmtree(app_dir)
+            shutil.copytree(test["dir"], app_dir)
+            self.worker_sources[app_dir] = source_dir
+
+        if not self.gen_test_datasets(test, sweep_mode, iteration, test_dir=app_dir):
+            return None
+
+        output_file = os.path.join(
+            worker_dir, os.path.basename(self.cfg["target"]["outputFile"])
+        )
+        try:
+            output_lines = self.run_sim_test(
+                test["appName"],
+                app_dir,
+                output_file,
+                self.get_timeouts(test["appName"], 1000),
+            )
+        except testit_util.TestFailure as e:
+            rich.print(f" - [yellow]WARNING[/yellow]: Test {test['appName']} {e}")
+            return testit_util.failure_results(
+                self.cfg["report"]["dir"],
+                test["appName"],
+                iteration,
+                test["outputTags"],
+                e,
+            )
+
+        return self.parse_output(
+            output_lines,
+            rf"{test['outputFormat']}",
+            test["outputTags"],
+            test.get("outputTypes"),
         )
-        return True
 
     # Generate a report of the last verification campaign.
     def gen_report(self, sort_key=None, ascending=True):
@@ -369,33 +589,22 @@ class TestItEnv:
         """
         console = Console(record=True)
 
-        with open(
-            f"{self.cfg['report']['dir']}/test_results.json", "r", encoding="utf-8"
-        ) as f:
-            results = json.load(f)
+        results = testit_util._load_database(self.cfg["report"]["dir"])
 
         for test_name, iterations in results.items():
 
             table = Table(title=f"Test Report: {test_name}")
 
-            if iterations:
-                for key in iterations[0].keys():
-                    table.add_column(key, style="cyan")
+            # Rows can have fields of their own, e.g. the Failure of a failed test
+            columns = list(dict.fromkeys(key for entry in iterations for key in entry))
+            for key in columns:
+                table.add_column(key, style="cyan")
 
-                if sort_key and sort_key in iterations[0]:
-                    try:
-                        # Try numeric sorting first
-                        iterations.sort(
-                            key=lambda x: int(x[sort_key]), reverse=not ascending
-                        )
-                    except ValueError:
-                        # Fallback to string sorting
-                        iterations.sort(
-                            key=lambda x: x[sort_key], reverse=not ascending
-                        )
+            if sort_key in columns:
+                iterations = _sort_entries(iterations, sort_key, ascending)
 
             for entry in iterations:
-                table.add_row(*[str(entry[key]) for key in entry])
+                table.add_row(*[str(entry.get(key, "")) for key in columns])
 
             console.print(table)
 
@@ -412,225 +621,231 @@ class TestItEnv:
             sweep_mode (bool, optional): If True, the function will generate datasets for a single test iteration. Defaults to False.
             test_iteration (int, optional): The test iteration to generate datasets for. Defaults
 
+        Returns:
+            bool: True if the datasets were successfully generated, False otherwise.
+        """
+        for test in self.cfg.get("tests", []):
+            if not self.gen_test_datasets(test, sweep_mode, test_iteration):
+                return False
+
+        return True
+
+    def draw_test_inputs(self, test, sweep_mode=False, test_iteration=None):
+        """Draw the parameter values and the input datasets of a test iteration.
+           Both are drawn from the random stream of the iteration, so the same iteration
+           always gets the same values.
+
+        Args:
+            test (dict): The test entry of the configuration file.
+            sweep_mode (bool, optional): If True, parameters are picked from the sweep space. Defaults to False.
+            test_iteration (int, optional): The test iteration to draw the values of. Defaults to None.
+
+        Raises:
+            ValueError: If the datatype or the generator of a dataset is not supported.
+
+        Returns:
+            tuple: The parameters, with their value for the iteration, and the input arrays.
+        """
+        rng = testit_util.dataset_rng(self.seed, test["appName"], test_iteration or 0)
+
+        # Parameter values are resolved on a copy of the parameters
+        parameters = [dict(param) for param in test.get("parameters", [])]
+        if sweep_mode and parameters:
+            # Points picked by a sweep strategy, or the grid by default
+            if "sweepPoints" in test:
+                sweep_parameters = test["sweepPoints"][test_iteration]
+            else:
+                sweep_parameters = testit_util.get_sweep_parameters(
+                    test_iteration, test["parameters"]
+                )
+
+        for index, param in enumerate(parameters):
+            if sweep_mode:
+                param["value"] = sweep_parameters[index]
+            # If the parameter's value is a list, take a random value from the range
+            elif isinstance(param["value"], list):
+                param["value"] = int(
+                    rng.integers(param["value"][0], param["value"][1], endpoint=True)
+                )
+
+        input_datasets = test.get("inputDataset", [])
+        if isinstance(input_datasets, dict):
+            input_datasets = [input_datasets]
+
+        input_arrays = []
+        for dataset in input_datasets:
+            # Handle parameter-dependent dimensions
+            dataset_shape = tuple(
+                (
+                    next((p["value"] for p in parameters if p["name"] == dim), 1)
+                    if isinstance(dim, str)
+                    else dim
+                )
+                for dim in dataset["dimensions"]
+            )
+
+            # Generate the dataset with the generator it selects
+            input_arrays.append(datasets.generate(rng, dataset, dataset_shape))
+
+        return parameters, input_arrays
+
+    def run_fingerprint(self, test, sweep_mode=False, test_iteration=None):
+        """Fingerprint the files that the datasets of a test iteration would be generated in.
+           They are written from the parameter values and the input datasets only, so these
+           are hashed instead of the files, without writing them.
+
+        Args:
+            test (dict): The test entry of the configuration file.
+            sweep_mode (bool, optional): If True, parameters are picked from the sweep space. Defaults to False.
+            test_iteration (int, optional): The test iteration to fingerprint. Defaults to None.
+
+        Returns:
+            str: The fingerprint, or None if the datasets can't be generated.
+        """
+        try:
+            parameters, input_arrays = self.draw_test_inputs(
+                test, sweep_mode, test_iteration
+            )
+        except Exception:
+            return None
+
+        hasher = hashlib.sha256()
+        hasher.update(test["appName"].encode("utf-8") + b"\0")
+        hasher.update(
+            json.dumps(
+                [[param["name"], param["value"]] for param in parameters], default=str
+            ).encode("utf-8")
+        )
+        cache.hash_arrays(hasher, input_arrays)
+        return hasher.hexdigest()
+
+    def report_results(self, app_name, iteration, results):
+        """Append the results of a test to the report, with the seed of the campaign and
+           the tags of the run, if it duplicates another one.
+
+        Args:
+            app_name (str): The name of the test.
+            iteration (int): The iteration of the test.
+            results (list): The results of the test.
+        """
+        tags = self.run_tags.get((app_name, iteration), {})
+        testit_util.append_results_to_report(
+            self.cfg["report"]["dir"],
+            app_name,
+            iteration,
+            [{**result, **tags} for result in results],
+            self.seed,
+        )
+
+    def gen_test_datasets(
+        self, test, sweep_mode=False, test_iteration=None, test_dir=None
+    ):
+        """Generate the datasets of a single test.
+
+        Args:
+            test (dict): The test entry of the configuration file.
+            sweep_mode (bool, optional): If True, parameters are picked from the sweep space. Defaults to False.
+            test_iteration (int, optional): The test iteration to generate datasets for. Defaults to None.
+            test_dir (str, optional): Directory where the files are written, instead of the test "dir". Defaults to None.
+
         Raises:
             ValueError: If the datatype is not supported.
 
         Returns:
             bool: True if the datasets were successfully generated, False otherwise.
         """
-        test_copy = copy.deepcopy(self.cfg.get("tests", []))
-        for test in test_copy:
-
+        if test_dir is None:
             test_dir = test["dir"]
-            if not os.path.exists(test_dir):
-                print(f"ERROR: Test directory '{test_dir}' not found.")
-                return False
-            
-
-            input_datasets = test.get("inputDataset", [])
-            output_datasets = test.get("outputDataset", [])
-
-            # Ensure input_datasets is a list (it might be a dict if only one exists)
-            if isinstance(input_datasets, dict):
-                input_datasets = [input_datasets]
-
-            # Ensure output_datasets is a list (it might be a dict if only one exists)
-            if isinstance(output_datasets, dict):
-                output_datasets = [output_datasets]
-
-            # Open files for writing
-            try:
-                if input_datasets or output_datasets: 
-                  with open(
-                      f"{test_dir}/{test['genFilesName']}.h", "w", encoding="utf-8"
-                  ) as h_file, open(
-                      f"{test_dir}/{test['genFilesName']}.c", "w", encoding="utf-8"
-                  ) as c_file:
-
-                      h_file.write("#ifndef TEST_DATA_H\n")
-                      h_file.write("#define TEST_DATA_H\n\n")
-                      h_file.write("#include <stdint.h>\n\n")
-
-                      # Iterate through parameters list
-                      if "parameters" in test:
-                          if sweep_mode:
-                              sweep_parameters = testit_util._get_sweep_parameters(test_iteration, test['parameters'])
-                          
-                          parameter_index = 0
-                          for param in test["parameters"]:
-
-                              param_name = param["name"]
-
-                              if not sweep_mode:
-                                  # If the parameter's value is a list, take a random value from the range
-                                  if isinstance(param["value"], list):
-                                      param_value = random.randint(
-                                          param["value"][0], param["value"][1]
-                                      )
-                                      param["value"] = param_value
-                              else:
-                                  param["value"] = sweep_parameters[parameter_index]
-                                  parameter_index += 1
-
-                              param_value = param["value"]
-                              h_file.write(f"#define {param_name} {param_value}\n")
-
-                      h_file.write("\n")
-
-                      file_name = test["genFilesName"]
-                      c_file.write(f'#include "{file_name}.h"\n\n')
-
-                      if input_datasets:
-
-                          input_arrays = []
-
-                          for dataset in input_datasets:
-                              dataset_name = dataset["name"]
-                              datatype = dataset["dataType"]
-                              value_range = dataset["valueRange"]
-                              dimensions = dataset["dimensions"]
-
-                              # Handle parameter-dependent dimensions
-                              converted_dimensions = []
-                              for dim in dimensions:
-                                  if isinstance(dim, str):
-                                      dim = next(
-                                          (
-                                              p["value"]
-                                              for p in test["parameters"]
-                                              if p["name"] == dim
-                                          ),
-                                          1,
-                                      )
-                                  converted_dimensions.append(dim)
-
-                              dataset_shape = tuple(converted_dimensions)
-
-                              # Generate a NumPy array with the correct shape and datatype
-                              if datatype == "uint8_t":
-                                  input_array = np.random.randint(
-                                      value_range[0],
-                                      value_range[1],
-                                      size=dataset_shape,
-                                      dtype=np.uint8,
-                                  )
-                              elif datatype == "uint16_t":
-                                  input_array = np.random.randint(
-                                      value_range[0],
-                                      value_range[1],
-                                      size=dataset_shape,
-                                      dtype=np.uint16,
-                                  )
-                              elif datatype == "uint32_t":
-                                  input_array = np.random.randint(
-                                      value_range[0],
-                                      value_range[1],
-                                      size=dataset_shape,
-                                      dtype=np.uint32,
-                                  )
-                              elif datatype == "uint64_t":
-                                  input_array = np.random.randint(
-                                      value_range[0],
-                                      value_range[1],
-                                      size=dataset_shape,
-                                      dtype=np.uint64,
-                                  )
-                              elif datatype == "int8_t":
-                                  input_array = np.random.randint(
-                                      value_range[0],
-                                      value_range[1],
-                                      size=dataset_shape,
-                                      dtype=np.int8,
-                                  )
-                              elif datatype == "int16_t":
-                                  input_array = np.random.randint(
-                                      value_range[0],
-                                      value_range[1],
-                                      size=dataset_shape,
-                                      dtype=np.int16,
-                                  )
-                              elif datatype == "int32_t":
-                                  input_array = np.random.randint(
-                                      value_range[0],
-                                      value_range[1],
-                                      size=dataset_shape,
-                                      dtype=np.int32,
-                                  )
-                              elif datatype == "int64_t":
-                                  input_array = np.random.randint(
-                                      value_range[0],
-                                      value_range[1],
-                                      size=dataset_shape,
-                                      dtype=np.int64,
-                                  )
-                              elif datatype == "float":
-                                  input_array = np.random.uniform(
-                                      value_range[0], value_range[1], size=dataset_shape
-                                  ).astype(np.float32)
-                              elif datatype == "double":
-                                  input_array = np.random.uniform(
-                                      value_range[0], value_range[1], size=dataset_shape
-                                  ).astype(np.float64)
-                              else:
-                                  raise ValueError(f"unsupported datatype '{datatype}'")
-
-                              input_arrays.append(input_array)
-
-                              total_size = np.prod(dataset_shape)
-                              h_file.write(
-                                  f"extern const {datatype} {dataset_name}[{total_size}];\n"
-                              )
-
-                              # Define dataset in Source File (data.c)
-                              c_file.write(
-                                  f"const {datatype} {dataset_name}[{total_size}]"
-                                  + " = {\n"
-                              )
-
-                              # Write the golden result array with formatting
-                              testit_util.write_array(c_file, input_array, dataset_shape)
-
-                              c_file.write("};\n\n")
-
-                      # Output datasets are not mandatory
-                      if output_datasets:
-                          # Generate the golden results using the golden function
-                          golden_function = testit_util.dyn_load_func(
-                              test["goldenResultFunction"]["name"]
-                          )
-                          golden_results = golden_function(
-                              input_arrays, test["parameters"]
-                          )
-
-                          # Ensure golden_results is a list (it might be a single array)
-                          if testit_util.is_numpy_array(golden_results):
-                              golden_results = [golden_results]
-
-                          # Write the golden result
-                          for iteration, golden_result in enumerate(golden_results):
-                              output_name = output_datasets[iteration]["name"]
-                              output_shape = golden_result.shape
-                              output_datatype = output_datasets[iteration]["dataType"]
-
-                              total_size = np.prod(output_shape)
-                              h_file.write(
-                                  f"extern const {output_datatype} {output_name}[{total_size}];\n"
-                              )
-
-                              c_file.write(
-                                  f"const {output_datatype} {output_name}[{total_size}]"
-                                  + " = {\n"
-                              )
-
-                              # Write the golden result array with formatting
-                              testit_util.write_array(c_file, golden_result, output_shape)
-
-                              c_file.write("};\n\n")
-
-                      # Close Header File
-                      h_file.write("\n#endif // TEST_DATA_H\n")
-            except Exception as e:
-                print(f"ERROR: {e}")
-                return False
+        if not os.path.exists(test_dir):
+            print(f"ERROR: Test directory '{test_dir}' not found.")
+            return False
+
+        input_datasets = test.get("inputDataset", [])
+        output_datasets = test.get("outputDataset", [])
+
+        # Ensure input_datasets is a list (it might be a dict if only one exists)
+        if isinstance(input_datasets, dict):
+            input_datasets = [input_datasets]
+
+        # Ensure output_datasets is a list (it might be a dict if only one exists)
+        if isinstance(output_datasets, dict):
+            output_datasets = [output_datasets]
+
+        # Open files for writing
+        try:
+            if input_datasets or output_datasets:
+                parameters, input_arrays = self.draw_test_inputs(
+                    test, sweep_mode, test_iteration
+                )
+
+                with open(
+                    f"{test_dir}/{test['genFilesName']}.h", "w", encoding="utf-8"
+                ) as h_file, open(
+                    f"{test_dir}/{test['genFilesName']}.c", "w", encoding="utf-8"
+                ) as c_file:
+
+                    h_file.write("#ifndef TEST_DATA_H\n")
+                    h_file.write("#define TEST_DATA_H\n\n")
+                    h_file.write("#include <stdint.h>\n\n")
+
+                    # Iterate through parameters list
+                    for param in parameters:
+                        h_file.write(f"#define {param['name']} {param['value']}\n")
+
+                    h_file.write("\n")
+
+                    file_name = test["genFilesName"]
+                    c_file.write(f'#include "{file_name}.h"\n\n')
+
+                    for dataset, input_array in zip(input_datasets, input_arrays):
+                        # Define dataset in Source File (data.c)
+                        testit_util.write_dataset(
+                            h_file,
+                            c_file,
+                            f"{test_dir}/{file_name}",
+                            dataset,
+                            input_array,
+                        )
+
+                    # Output datasets are not mandatory
+                    if output_datasets:
+                        # Generate the golden results using the golden function
+                        golden_results = self.gen_golden_results(
+                            test["goldenResultFunction"]["name"],
+                            input_arrays,
+                            parameters,
+                        )
+
+                        # Write the golden result
+                        for iteration, golden_result in enumerate(golden_results):
+                            # Write the golden result array with formatting
+                            testit_util.write_dataset(
+                                h_file,
+                                c_file,
+                                f"{test_dir}/{file_name}",
+                                output_datasets[iteration],
+                                golden_result,
+                            )
+
+                            # Let the application check its results on the device
+                            testit_util.write_verifier(
+                                h_file,
+                                c_file,
+                                output_datasets[iteration],
+                                golden_result,
+                            )
+
+                    # Close Header File
+                    h_file.write("\n#endif // TEST_DATA_H\n")
+
+            if self.binary_protocol:
+                testit_util.write_proto_header(
+                    f"{test_dir}/testit_proto.h",
+                    self.baudrate or 0,
+                    test["outputTags"],
+                )
+        except Exception as e:
+            print(f"ERROR: {e}")
+            return False
 
         return True
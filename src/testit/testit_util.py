@@ -13,15 +13,24 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <https://www.gnu.org/licenses/>.
 
+import collections
 import importlib.util
 import json
 import os
+import random
+import re
+import selectors
+import shutil
+import signal
+import struct
 import subprocess
 import sys
 import threading
+import time
+import zlib
 
+import importlib_resources as resources
 import numpy as np
-import rich
 import serial
 
 # Set this to True to enable debugging prints
@@ -31,6 +40,8 @@ DEBUG_MODE = False
 
 def write_array(f, array, shape, indent=2):
     """Writes a numpy array to a file in a human-readable format.
+       The array is formatted one row (last dimension) at a time and written with a
+       single call. Single precision values get the "f" suffix of C float literals.
 
     Args:
         f (file): The file object to write to.
@@ -38,35 +49,154 @@ def write_array(f, array, shape, indent=2):
         shape (tuple): The shape of the array.
         indent (int, optional): The number of spaces to indent the output. Defaults to 2.
     """
-    flat_array = array.flatten()
+    flat_array = np.asarray(array).flatten()
     num_dims = len(shape)
-    f.write(" " * indent)
+    row_len = shape[-1] if num_dims > 0 and shape[-1] > 0 else max(len(flat_array), 1)
+    num_rows = -(-len(flat_array) // row_len)
 
-    for i, value in enumerate(flat_array):
+    # Numpy scalars are formatted as Python scalars, which tolist() converts to in bulk
+    values = list(map(str, flat_array.tolist()))
+    if flat_array.dtype == np.float32:
+        values = [value + "f" for value in values]
 
-        f.write(f" {value}")
+    # Number of rows in each block: a block boundary is crossed when the rows
+    # written so far are a multiple of its size
+    block_rows = [int(np.prod(shape[-d:-1])) for d in range(2, num_dims + 1)]
 
-        if i < len(flat_array) - 1:
-            f.write(",")
+    buffer = [" " * indent]
+    for row in range(num_rows):
+        buffer.append(" " + ", ".join(values[row * row_len : (row + 1) * row_len]))
+
+        if row < num_rows - 1:
             # Insert a newline after every "row" (last dimension)
-            if (i + 1) % shape[-1] == 0:
-                f.write("\n" + " " * indent)
+            buffer.append(",\n" + " " * indent)
+
+            # Insert blank lines when finishing a 2D block (one), a 3D block (two),
+            # a 4D block (two more), and so on...
+            for d, rows in enumerate(block_rows, start=2):
+                if (row + 1) % rows == 0:
+                    buffer.append("\n" * (1 if d == 2 else max(2, d - 2)))
+
+    buffer.append("\n" + " " * indent)
+    f.write("".join(buffer))
+
+
+# NumPy element type of every supported C datatype
+C_TYPES = {
+    "uint8_t": np.uint8,
+    "uint16_t": np.uint16,
+    "uint32_t": np.uint32,
+    "uint64_t": np.uint64,
+    "int8_t": np.int8,
+    "int16_t": np.int16,
+    "int32_t": np.int32,
+    "int64_t": np.int64,
+    "float": np.float32,
+    "double": np.float64,
+}
+
+
+def write_dataset(h_file, c_file, blob_prefix, dataset, array):
+    """Declares a dataset in the generated header and defines it in the generated source.
+       Datasets with "format: bin" are dumped as raw little-endian bytes to
+       "<blob_prefix>_<name>.bin", which the generated source pulls in with an
+       ".incbin" directive instead of a C initializer list.
+
+    Args:
+        h_file (file): The generated header file.
+        c_file (file): The generated source file.
+        blob_prefix (str): Path prefix of the binary blobs of the test.
+        dataset (dict): The dataset entry of the configuration file.
+        array (numpy.ndarray): The values of the dataset.
+
+    Raises:
+        ValueError: If the datatype is not supported by binary datasets.
+    """
+    name = dataset["name"]
+    datatype = dataset["dataType"]
+    total_size = np.prod(array.shape)
 
-            # Insert a **blank line** when finishing a 2D block (2nd-to-last dimension)
-            if num_dims > 2 and (i + 1) % (shape[-2] * shape[-1]) == 0:
-                f.write("\n")
+    h_file.write(f"extern const {datatype} {name}[{total_size}];\n")
 
-            # Insert **two blank outputLines** when finishing a 3D block
-            if num_dims > 3 and (i + 1) % (shape[-3] * shape[-2] * shape[-1]) == 0:
-                f.write("\n\n")
+    if dataset.get("format", "text") != "bin":
+        c_file.write(f"const {datatype} {name}[{total_size}]" + " = {\n")
+        write_array(c_file, array, array.shape)
+        c_file.write("};\n\n")
+        return
 
-            # Insert **three blank outputLines** when finishing a 4D block, and so on...
-            if num_dims > 4:
-                for d in range(4, num_dims + 1):
-                    if (i + 1) % np.prod(shape[-d:]) == 0:
-                        f.write("\n" * (d - 2))
+    if datatype not in C_TYPES:
+        raise ValueError(f"unsupported datatype '{datatype}' for binary dataset")
+
+    blob = np.ascontiguousarray(
+        array, dtype=np.dtype(C_TYPES[datatype]).newbyteorder("<")
+    )
+    blob_path = os.path.abspath(f"{blob_prefix}_{name}.bin")
+    blob.tofile(blob_path)
+
+    blob_path = blob_path.replace("\\", "\\\\").replace('"', '\\"')
+    c_file.write(
+        "__asm__(\n"
+        f'  ".pushsection .rodata.{name}, \\"a\\"\\n"\n'
+        f'  ".balign {max(blob.itemsize, 4)}\\n"\n'
+        f'  ".global {name}\\n"\n'
+        f'  "{name}:\\n"\n'
+        f'  ".incbin \\"{blob_path}\\"\\n"\n'
+        f'  ".size {name}, {blob.nbytes}\\n"\n'
+        '  ".popsection\\n"\n'
+        ");\n\n"
+    )
+
+
+def write_verifier(h_file, c_file, dataset, array):
+    """Writes the routine that compares the results of the application with an output
+       dataset, so that only the number of mismatches and the index of the first one
+       need to be sent back, whatever the size of the dataset.
+       Floating point datasets can set a "tolerance": values differing by at most that
+       much are considered equal.
+
+    Args:
+        h_file (file): The generated header file.
+        c_file (file): The generated source file.
+        dataset (dict): The output dataset entry of the configuration file.
+        array (numpy.ndarray): The reference values of the dataset.
+
+    Raises:
+        ValueError: If a tolerance is set on an integer dataset.
+    """
+    name = dataset["name"]
+    datatype = dataset["dataType"]
+    tolerance = dataset.get("tolerance")
+    total_size = np.prod(array.shape)
+
+    if tolerance is None:
+        mismatch = f"result[i] != {name}[i]"
+    elif datatype in ("float", "double"):
+        # Written so that NaN results are mismatches
+        mismatch = (
+            f"!(result[i] - {name}[i] <= {tolerance!r} && "
+            f"{name}[i] - result[i] <= {tolerance!r})"
+        )
+    else:
+        raise ValueError(f"tolerance is not supported by '{datatype}' dataset {name}")
 
-    f.write("\n" + " " * indent)
+    signature = (
+        f"uint32_t testit_verify_{name}(const {datatype} *result, int32_t *first)"
+    )
+    h_file.write(f"{signature};\n")
+    c_file.write(
+        f"{signature}\n"
+        "{\n"
+        "  uint32_t mismatches = 0;\n"
+        "  *first = -1;\n"
+        f"  for (uint32_t i = 0; i < {total_size}; i++) {{\n"
+        f"    if ({mismatch}) {{\n"
+        "      if (mismatches++ == 0)\n"
+        "        *first = (int32_t)i;\n"
+        "    }\n"
+        "  }\n"
+        "  return mismatches;\n"
+        "}\n\n"
+    )
 
 
 def _load_database(results_dir):
@@ -78,10 +208,34 @@ def _load_database(results_dir):
     Returns:
         dict: The test results database. If the database does not exist, an empty dictionary is returned.
     """
-    if os.path.exists(f"{results_dir}/test_results.json"):
+    db = {}
+    for test_name, result_entry in iter_results(results_dir):
+        db.setdefault(test_name, []).append(result_entry)
+    return db
+
+
+def iter_results(results_dir):
+    """Streams the entries of the test results database, one at a time.
+       Databases written by older TestIt versions as a single "test_results.json"
+       are still read, so that their reports can be generated.
+
+    Args:
+        results_dir (str): The directory containing the test results database.
+
+    Yields:
+        tuple: The test name and the result entry, in the order they were appended.
+    """
+    if os.path.exists(f"{results_dir}/test_results.jsonl"):
+        with open(f"{results_dir}/test_results.jsonl", "r", encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record["test"], record["result"]
+    elif os.path.exists(f"{results_dir}/test_results.json"):
         with open(f"{results_dir}/test_results.json", "r") as file:
-            return json.load(file)
-    return {}
+            for test_name, result_entries in json.load(file).items():
+                for result_entry in result_entries:
+                    yield test_name, result_entry
 
 
 def clear_database(result_dir):
@@ -90,43 +244,258 @@ def clear_database(result_dir):
     Args:
         result_dir (str): The directory containing the test results database.
     """
-    if os.path.exists(f"{result_dir}/test_results.json"):
-        os.remove(f"{result_dir}/test_results.json")
+    for file_name in ("test_results.jsonl", "test_results.json"):
+        if os.path.exists(f"{result_dir}/{file_name}"):
+            os.remove(f"{result_dir}/{file_name}")
+    shutil.rmtree(f"{result_dir}/logs", ignore_errors=True)
+    if os.path.exists(f"{result_dir}/{CHECKPOINT_FILE}"):
+        os.remove(f"{result_dir}/{CHECKPOINT_FILE}")
+
 
+def prune_database(result_dir, runs):
+    """Keeps only the results of the given runs in the database.
+       Used when a campaign is resumed: the results of the runs that were interrupted
+       before being recorded in the checkpoint journal are dropped, and run again.
 
-def append_results_to_report(result_dir, test_name, iteration, results):
+    Args:
+        result_dir (str): The directory containing the test results database.
+        runs (set): The (test name, iteration) pairs to keep.
+    """
+    path = f"{result_dir}/test_results.jsonl"
+    if not os.path.exists(path):
+        return
+
+    with open(path, "r", encoding="utf-8") as file, open(
+        f"{path}.tmp", "w", encoding="utf-8"
+    ) as pruned:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # The last line of a campaign killed while writing it
+                continue
+            if (record["test"], record["result"]["iteration"]) in runs:
+                pruned.write(line if line.endswith("\n") else line + "\n")
+    os.replace(f"{path}.tmp", path)
+
+
+def append_results_to_report(result_dir, test_name, iteration, results, seed=None):
     """Append results to the report database.
+       The database is a JSON Lines file: every result is a single line appended
+       at the end of it, so that the cost of a write doesn't grow with the campaign.
 
     Args:
         result_dir (str): The directory containing the test results database.
         test_name (str): The name of the test.
         iteration (int): The iteration number.
         results (list): The list of results to append.
+        seed (int, optional): The seed of the campaign, to generate the datasets of the
+               test again. Defaults to None.
     """
-    db = _load_database(result_dir)
-
     print_deb(
         f"Appending results to report: {test_name}, iteration {iteration}, results: {results}"
     )
 
-    # Ensure the test has a list initialized
-    if test_name not in db:
-        db[test_name] = []
+    os.makedirs(result_dir, exist_ok=True)
+    with open(f"{result_dir}/test_results.jsonl", "a", encoding="utf-8") as file:
+        for result in results:
+            result_entry = {"iteration": iteration, **result}
+            if seed is not None:
+                result_entry["seed"] = seed
+            file.write(json.dumps({"test": test_name, "result": result_entry}) + "\n")
+
+
+# Journal of the runs completed by the campaign, in the report directory
+CHECKPOINT_FILE = "checkpoint.jsonl"
+
+
+def dataset_rng(seed, test_name, iteration):
+    """Returns the random generator of the datasets of a test iteration.
+       Every (test, iteration) pair draws from its own stream, spawned from the seed of
+       the campaign: its datasets don't depend on the order the tests run in, nor on
+       the other tests running at the same time, and the seed is enough to generate
+       them again.
+
+    Args:
+        seed (int): The seed of the campaign, None for a random one.
+        test_name (str): The name of the test.
+        iteration (int): The iteration of the test.
+
+    Returns:
+        numpy.random.Generator: The generator, on the PCG64 bit generator.
+    """
+    sequence = np.random.SeedSequence(
+        seed, spawn_key=(zlib.crc32(test_name.encode("utf-8")), iteration)
+    )
+    return np.random.Generator(np.random.PCG64(sequence))
+
+
+class Checkpoint:
+    """The journal of the runs completed by a campaign, to resume it after a crash.
+
+    The first line of the journal describes the campaign, with its seed, and each
+    completed run appends a line with its test, iteration, sweep point and duration.
+    A line is written once the results of the run are in the database, so the
+    journal never records a run that isn't there.
+    """
+
+    def __init__(self, result_dir):
+        self.result_dir = result_dir
+        self.path = f"{result_dir}/{CHECKPOINT_FILE}"
+        self.campaign = None
+        self.runs = []
+
+    @property
+    def seed(self):
+        """The seed of the campaign, from which every random generator is derived."""
+        return self.campaign["seed"]
+
+    def start(self, fingerprint, seed=None):
+        """Starts the journal of a new campaign.
+
+        Args:
+            fingerprint (str): Identifies the configuration of the campaign.
+            seed (int, optional): The seed of the campaign. Defaults to None, i.e. a random one.
+        """
+        if seed is None:
+            seed = random.randrange(1 << 32)
+        self.campaign = {"fingerprint": fingerprint, "seed": seed}
+        self.runs = []
+        os.makedirs(self.result_dir, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as file:
+            file.write(json.dumps({"campaign": self.campaign}) + "\n")
+
+    def load(self):
+        """Loads the journal of the last campaign.
+
+        Returns:
+            bool: True if there was a journal to load, False otherwise.
+        """
+        if not os.path.exists(self.path):
+            return False
+
+        self.campaign = None
+        self.runs = []
+        with open(self.path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last line of a campaign killed while writing it
+                    continue
+                if "campaign" in record:
+                    self.campaign = record["campaign"]
+                else:
+                    self.runs.append(record)
+        return self.campaign is not None
+
+    def add(self, test, iteration, duration):
+        """Records a completed run.
+
+        Args:
+            test (dict): The test entry of the configuration file.
+            iteration (int): The iteration of the test.
+            duration (float): The duration of the run, in seconds.
+        """
+        run = {
+            "test": test["appName"],
+            "iteration": iteration,
+            "point": test["sweepPoints"][iteration] if "sweepPoints" in test else None,
+            "duration": duration,
+        }
+        self.runs.append(run)
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(run) + "\n")
+
+    def completed(self, test_name):
+        """Returns the set of the completed iterations of a test."""
+        return {run["iteration"] for run in self.runs if run["test"] == test_name}
+
+    def durations(self):
+        """Returns the durations of the completed runs, in the format of the duration report."""
+        report = {}
+        for run in self.runs:
+            report.setdefault(run["iteration"], []).append(
+                {"name": run["test"], "duration": run["duration"]}
+            )
+        return report
+
+
+class GoldenModule:
+    """The golden module of the campaign, 'testit_golden.py'.
+
+    The module is imported the first time one of its functions is needed, and
+    imported again only if the file is modified afterwards.
+    """
+
+    def __init__(self, module_path):
+        self.module_path = module_path
+        self.module = None
+        self.mtime = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Imports the module, unless the loaded version is up to date.
+
+        Raises:
+            ImportError: If the module is not found.
+
+        Returns:
+            module: The golden module.
+        """
+        with self.lock:
+            if not os.path.exists(self.module_path):
+                raise ImportError(
+                    f"Module testit_golden not found in current directory: {self.module_path}"
+                )
+
+            mtime = os.path.getmtime(self.module_path)
+            if self.module is None or mtime != self.mtime:
+                spec = importlib.util.spec_from_file_location(
+                    "testit_golden", self.module_path
+                )
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                self.module, self.mtime = module, mtime
 
-    # Append new result
-    for result in results:
-        result_entry = {"iteration": iteration, **result}
-        db[test_name].append(result_entry)
+            return self.module
 
-    print_deb(f"Database after appending: {db}")
+    def get(self, function_name):
+        """Returns a function of the module.
 
-    # Save back to JSON
-    with open(f"{result_dir}/test_results.json", "w", encoding="utf-8") as file:
-        json.dump(db, file, indent=4)
+        Raises:
+            AttributeError: If the function is not found in the module.
+        """
+        module = self.load()
+        if not hasattr(module, function_name):
+            raise AttributeError(f"Function {function_name} not found in testit_golden")
+        return getattr(module, function_name)
+
+    def missing(self, function_names):
+        """Returns the functions that are not defined by the module."""
+        module = self.load()
+        return [name for name in function_names if not hasattr(module, name)]
+
+
+# Golden modules loaded so far, by path
+_golden_modules = {}
+
+
+def get_golden_module():
+    """Returns the golden module of the current directory.
+
+    Returns:
+        GoldenModule: The golden module.
+    """
+    module_path = os.path.join(os.getcwd(), "testit_golden.py")
+    if module_path not in _golden_modules:
+        _golden_modules[module_path] = GoldenModule(module_path)
+    return _golden_modules[module_path]
 
 
 def dyn_load_func(function_name):
     """Dynamic loading of a function from 'testit_golden.py'.
+       The module is imported once and shared by every call.
 
     Args:
         function_name (str): The name of the function to load.
@@ -139,59 +508,281 @@ def dyn_load_func(function_name):
     Returns:
         function: The loaded function.
     """
-    module_name = "testit_golden"
-    module_path = os.path.join(os.getcwd(), f"{module_name}.py")
+    return get_golden_module().get(function_name)
+
+
+class RingBuffer:
+    """A byte FIFO stored in a fixed bytearray, which grows only when it's full."""
+
+    def __init__(self, capacity=1 << 16):
+        self.data = bytearray(capacity)
+        self.start = 0
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def write(self, chunk):
+        """Appends some bytes at the end of the buffer."""
+        if self.length + len(chunk) > len(self.data):
+            self._grow(self.length + len(chunk))
+
+        capacity = len(self.data)
+        end = (self.start + self.length) % capacity
+        first = min(len(chunk), capacity - end)
+        self.data[end : end + first] = chunk[:first]
+        self.data[: len(chunk) - first] = chunk[first:]
+        self.length += len(chunk)
+
+    def peek(self, begin, end):
+        """Returns the bytes between two offsets from the start of the buffer."""
+        capacity = len(self.data)
+        first = (self.start + begin) % capacity
+        size = end - begin
+        if first + size <= capacity:
+            return bytes(self.data[first : first + size])
+        return bytes(self.data[first:]) + bytes(self.data[: first + size - capacity])
+
+    def read(self, size):
+        """Removes and returns the first bytes of the buffer."""
+        chunk = self.peek(0, size)
+        self.start = (self.start + size) % len(self.data)
+        self.length -= size
+        return chunk
+
+    def clear(self):
+        """Drops the content of the buffer."""
+        self.start = 0
+        self.length = 0
+
+    def _grow(self, size):
+        capacity = len(self.data)
+        while capacity < size:
+            capacity *= 2
+        content = self.peek(0, self.length)
+        self.data = bytearray(capacity)
+        self.data[: len(content)] = content
+        self.start = 0
+
+
+# Binary records of the serial protocol (see templates/testit_proto.h): sync word,
+# type and payload length, followed by the payload and the CRC-32 of all but the sync
+RECORD_HEADER = struct.Struct("<HBH")
+RECORD_SYNC = 0x5AA5
+RECORD_RESULT = 0x01
+RECORD_END = 0xFF
+RECORD_CRC_SIZE = 4
+
+
+def encode_record(record_type, payload=b""):
+    """Encodes a binary record, like testit_send_record() does on the target."""
+    header = RECORD_HEADER.pack(RECORD_SYNC, record_type, len(payload))
+    crc = zlib.crc32(header[2:] + payload)
+    return header + payload + crc.to_bytes(RECORD_CRC_SIZE, "little")
+
+
+def iter_records(data):
+    """Iterates over the valid binary records of a buffer.
+       Bytes that don't belong to a record, such as a boot banner, and records with a
+       wrong CRC are skipped.
 
-    if not os.path.exists(module_path):
-        raise ImportError(
-            f"Module {module_name} not found in current directory: {module_path}"
-        )
+    Args:
+        data (bytes): The received bytes.
 
-    spec = importlib.util.spec_from_file_location(module_name, module_path)
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
+    Yields:
+        tuple: The type and the payload of each record.
+    """
+    pos = 0
+    while pos + RECORD_HEADER.size <= len(data):
+        sync, record_type, size = RECORD_HEADER.unpack_from(data, pos)
+        end = pos + RECORD_HEADER.size + size + RECORD_CRC_SIZE
+        if sync != RECORD_SYNC or end > len(data):
+            pos += 1
+            continue
 
-    if not hasattr(module, function_name):
-        raise AttributeError(f"Function {function_name} not found in {module_name}")
+        crc = int.from_bytes(data[end - RECORD_CRC_SIZE : end], "little")
+        if zlib.crc32(data[pos + 2 : end - RECORD_CRC_SIZE]) != crc:
+            pos += 1
+            continue
 
-    return getattr(module, function_name)
+        yield record_type, data[pos + RECORD_HEADER.size : end - RECORD_CRC_SIZE]
+        pos = end
 
 
-def serial_rx_setup(ser: serial.Serial, serial_comm_queue, endword="&"):
-    """Reads data from the serial port and puts it into a queue.
-       Attention: comunications must end with the endword character.
+def decode_results(data, output_tags):
+    """Decodes the result records of a test output.
 
     Args:
-        ser (serial.Serial): The serial port object.
-        serial_comm_queue (queue.Queue): The queue to put the received data.
-        endword (str, optional): The character to end the communication. Defaults
-            to "&".
-    Raises:
-        serial.SerialException: If the serial port is not open.
+        data (bytes): The output of the test.
+        output_tags (list): The tags of the result fields, in the order they are sent.
+
+    Returns:
+        list: A dictionary of tagged values for each result record.
     """
-    try:
-        if not ser.is_open:
-            raise serial.SerialException("Serial port not open")
-
-        received = False
-        while not received:
-            # Read the data from the serial port
-            line = ser.readline().decode("utf-8").rstrip()
-            serial_comm_queue.put(line)
-            print_deb(f">: {line}")
-            if line:
-                if endword in line:
-                    received = True
-                    print_deb(f"Received {endword}: end of serial transmission thread")
+    size = 4 * len(output_tags)
+    payloads = [
+        payload
+        for record_type, payload in iter_records(data)
+        if record_type == RECORD_RESULT and len(payload) == size
+    ]
+    if not payloads:
+        return []
+
+    values = np.frombuffer(b"".join(payloads), dtype="<i4").reshape(
+        -1, len(output_tags)
+    )
+    return [dict(zip(output_tags, map(str, row))) for row in values.tolist()]
+
+
+def write_proto_header(path, baudrate, output_tags):
+    """Writes the C helper header of the binary serial protocol.
+
+    Args:
+        path (str): The path of the header.
+        baudrate (int): The baud rate the application must set on its serial port.
+        output_tags (list): The tags of the result fields.
+    """
+    template = resources.files("testit") / "templates/testit_proto.h"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("#ifndef TESTIT_PROTO_H\n#define TESTIT_PROTO_H\n\n")
+        f.write(f"#define TESTIT_BAUDRATE {baudrate}\n")
+        f.write(f"#define TESTIT_RESULT_FIELDS {len(output_tags)}\n\n")
+        f.write(template.read_text(encoding="utf-8"))
+        f.write("\n#endif // TESTIT_PROTO_H\n")
+
+
+class SerialReader:
+    """Reads a serial port in a persistent thread, and splits what it receives in frames.
+       Attention: every frame, i.e. the output of a test, must end with the endword, or
+       with an END record when the binary protocol is used.
+
+       Incoming data is read in chunks, as soon as it's available, into a ring buffer
+       that is scanned for the endword only: the whole output of a test is handed over
+       as a single buffer, and decoded by the consumer.
+    """
+
+    def __init__(self, ser: serial.Serial, endword="&", binary=False):
+        self.ser = ser
+        self.endword = endword.encode("utf-8")
+        self.binary = binary
+        self.buffer = RingBuffer()
+        # Offset up to which the buffer was already scanned for the endword, or of the
+        # first record not parsed yet
+        self.scanned = 0
+        self.frames = collections.deque()
+        self.error = None
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._receive, daemon=True)
+
+    def start(self):
+        """Starts the reception thread."""
+        self.thread.start()
+
+    def stop(self):
+        """Stops the reception thread."""
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def clear(self):
+        """Drops every frame received so far, and any partial one."""
+        with self.condition:
+            self.frames.clear()
+            self.buffer.clear()
+            self.scanned = 0
+
+    def next_frame(self, timeout=None):
+        """Waits for the next frame.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the frame. Defaults to None,
+                i.e. wait until the frame arrives or the reception stops.
+
+        Returns:
+            bytes: The frame, endword included, or None if it didn't arrive.
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.frames
+                or self.stop_event.is_set()
+                or self.error is not None,
+                timeout,
+            )
+            return self.frames.popleft() if self.frames else None
+
+    def _receive(self):
+        try:
+            if not self.ser.is_open:
+                raise serial.SerialException("Serial port not open")
+
+            while not self.stop_event.is_set():
+                # Wait for the first byte (up to the port timeout), then take all the others
+                chunk = self.ser.read(max(1, self.ser.in_waiting))
+                if chunk:
+                    self._append(chunk)
+        except serial.SerialException as e:
+            self.error = e
+            print(f"Serial exception: {e}")
+        except Exception as e:
+            self.error = e
+            print(f"An ERROR occurred: {e}")
+        finally:
+            with self.condition:
+                self.condition.notify_all()
+
+    def _append(self, chunk):
+        with self.condition:
+            self.buffer.write(chunk)
+
+            while self.binary:
+                end = self._find_end_record()
+                if end is None:
+                    return
+                self.frames.append(self.buffer.read(end))
+                self.scanned = 0
+                print_deb("Received END record: end of the test output")
+                self.condition.notify_all()
+
+            while True:
+                # The endword may straddle the previous chunk and this one
+                begin = max(0, self.scanned - len(self.endword) + 1)
+                index = self.buffer.peek(begin, len(self.buffer)).find(self.endword)
+                if index < 0:
+                    self.scanned = len(self.buffer)
                     return
-    except serial.SerialException as e:
-        print(f"Serial exception: {e}")
-    except Exception as e:
-        print(f"An ERROR occurred: {e}")
-    except KeyboardInterrupt:
-        print("Keyboard interruption")
-    finally:
-        pass
+
+                self.frames.append(self.buffer.read(begin + index + len(self.endword)))
+                self.scanned = 0
+                print_deb(f"Received {self.endword}: end of the test output")
+                self.condition.notify_all()
+
+    def _find_end_record(self):
+        # Only the headers and the CRC of the new records are checked here: the payloads
+        # are decoded by the consumer
+        while self.scanned + RECORD_HEADER.size <= len(self.buffer):
+            sync, record_type, size = RECORD_HEADER.unpack(
+                self.buffer.peek(self.scanned, self.scanned + RECORD_HEADER.size)
+            )
+            end = self.scanned + RECORD_HEADER.size + size + RECORD_CRC_SIZE
+            if sync != RECORD_SYNC:
+                self.scanned += 1
+                continue
+            if end > len(self.buffer):
+                return None
+
+            record = self.buffer.peek(self.scanned + 2, end)
+            crc = int.from_bytes(record[-RECORD_CRC_SIZE:], "little")
+            if zlib.crc32(record[:-RECORD_CRC_SIZE]) != crc:
+                self.scanned += 1
+                continue
+
+            self.scanned = end
+            if record_type == RECORD_END:
+                return end
+        return None
 
 
 def print_deb(*args, **kwargs):
@@ -212,40 +803,239 @@ def is_numpy_array(obj):
     return isinstance(obj, np.ndarray)
 
 
-def _run_command_threading(command):
-    thread = threading.Thread(target=__run_command, args=(command,), daemon=True)
-    thread.start()
-    return thread
+# Stages of a test that can have a deadline
+TEST_STAGES = ["compile", "load", "run"]
+
+# Category of the failures of each stage of a test, besides "timeout"
+FAILURE_KINDS = {"compile": "compile", "load": "load", "run": "runtime"}
 
+# Lines that reveal a failure in the log of a stage, on top of a non-zero exit code:
+# simulators don't always exit with an error code when the testbench fails. Messages
+# are matched at the start of a line, so that "-Werror" or "error.c" don't count.
+DEFAULT_ERROR_RULES = [r"^\s*(?:\*\*\s*)?%?(?:ERROR|Error|FATAL|Fatal)\b"]
 
-# If the command fails, the process will terminate and the script will exit
-def __run_command(command):
+
+class TestFailure(Exception):
+    """Raised when a stage of a test fails. The failure is recorded in the results,
+       together with the log of the stage, and the campaign moves on.
+    """
+
+    def __init__(self, stage, reason, log=None):
+        super().__init__(f"{stage} stage {reason}")
+        self.stage = stage
+        self.kind = FAILURE_KINDS[stage]
+        self.log = log or []
+
+
+class StageTimeout(TestFailure):
+    """Raised when a stage of a test misses its deadline."""
+
+    def __init__(self, stage, timeout, log=None):
+        super().__init__(stage, f"timed out after {timeout} s", log)
+        self.kind = "timeout"
+        self.timeout = timeout
+
+
+class ErrorRules:
+    """The regexes that reveal a failure in the log of each stage, compiled once.
+       The "errorRules" field of the target maps a stage ("build", "compile", "load"
+       or "run") to its own list of regexes, which replaces the default one.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = rules or {}
+        self.patterns = {}
+
+    def get(self, stage):
+        """Returns the regex that matches the error lines of a stage, or None."""
+        if stage not in self.patterns:
+            rules = self.rules.get(stage, DEFAULT_ERROR_RULES)
+            self.patterns[stage] = (
+                re.compile("|".join(f"(?:{rule})" for rule in rules)) if rules else None
+            )
+        return self.patterns[stage]
+
+
+# Number of log lines of a streamed command kept for the failure logs
+LOG_TAIL_LINES = 1000
+# Seconds between two checks of the output file of a streamed command
+POLL_INTERVAL = 0.1
+
+
+class StreamResult(
+    collections.namedtuple("StreamResult", ["returncode", "error", "finished", "log"])
+):
+    """Outcome of a streamed command: "error" is the first line matching the error
+       rules, if any, "finished" tells whether the endword was found, and "log" holds
+       the last lines printed.
+    """
+
+    def failure(self):
+        """Returns why the command failed, or None if it succeeded."""
+        if self.error is not None:
+            return f"failed: {self.error.strip()}"
+        # A command stopped on the endword was killed on purpose
+        if not self.finished and self.returncode != 0:
+            return f"failed with exit code {self.returncode}"
+        return None
+
+
+class _EndwordWatcher:
+    """Checks whether the endword was written to a file, reading only what's new."""
+
+    def __init__(self, path, endword):
+        self.path = path
+        self.endword = endword
+        self.scanned = 0
+
+    def found(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return False
+        if size < self.scanned:
+            # The file was truncated: scan it again from the start
+            self.scanned = 0
+        if size == self.scanned:
+            return False
+
+        # The endword may straddle the content already scanned and the new one
+        begin = max(0, self.scanned - len(self.endword) + 1)
+        with open(self.path, "rb") as f:
+            f.seek(begin)
+            data = f.read(size - begin)
+        self.scanned = size
+        return self.endword in data
+
+
+def _kill_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    process.wait()
+
+
+def stream_command(
+    command,
+    timeout=None,
+    stage="run",
+    output_file=None,
+    endword=None,
+    error_rule=None,
+):
+    """Runs a shell command and scans its output line by line, as it's printed.
+       The command is stopped as soon as a line matches the error rule, or as soon as
+       the endword shows up in its output file, without waiting for it to exit. Only
+       the last LOG_TAIL_LINES lines of its output are kept in memory.
+
+    Args:
+        command (str): The shell command.
+        timeout (float, optional): Seconds the command can run. Defaults to None, i.e. no deadline.
+        stage (str, optional): The stage of the test the command belongs to. Defaults to "run".
+        output_file (str, optional): The file the command writes its results to. Defaults to None.
+        endword (bytes, optional): The end of the results in the output file. Defaults to None.
+        error_rule (re.Pattern, optional): The regex of the error lines. Defaults to None.
+
+    Raises:
+        StageTimeout: If the command didn't complete in time.
+
+    Returns:
+        StreamResult: The outcome of the command.
+    """
     process = subprocess.Popen(
-        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, shell=True
+        command,
+        shell=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        start_new_session=True,
     )
+    deadline = None if timeout is None else time.monotonic() + timeout
+    watcher = None
+    if output_file is not None and endword:
+        watcher = _EndwordWatcher(output_file, endword)
+
+    log = collections.deque(maxlen=LOG_TAIL_LINES)
+    error = None
+    finished = False
+    pending = b""
+
+    def scan(lines):
+        nonlocal error
+        for line in lines:
+            text = line.decode("utf-8", errors="replace").rstrip("\r")
+            log.append(text + "\n")
+            if error is None and error_rule is not None and error_rule.search(text):
+                error = text
+
+    try:
+        with selectors.DefaultSelector() as selector:
+            selector.register(process.stdout, selectors.EVENT_READ)
+            while error is None:
+                wait = POLL_INTERVAL
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        raise StageTimeout(stage, timeout, list(log))
+
+                if selector.select(wait):
+                    chunk = os.read(process.stdout.fileno(), 1 << 16)
+                    if not chunk:
+                        # Every process of the command closed the log: it's over
+                        scan([pending] if pending else [])
+                        break
+                    lines = (pending + chunk).split(b"\n")
+                    pending = lines.pop()
+                    scan(lines)
+
+                if watcher is not None and watcher.found():
+                    finished = True
+                    break
+    except BaseException:
+        _kill_group(process)
+        raise
+    finally:
+        process.stdout.close()
+
+    if error is not None or finished:
+        print_deb(f"Stopping {command}: {error or 'end of the test output'}")
+        _kill_group(process)
+    else:
+        process.wait()
+    return StreamResult(process.returncode, error, finished, list(log))
+
 
-    while True:
-        output = process.stdout.readline()
-        if output:
-            if "ERROR" in output or "Error" in output or "error" in output:
-                process.terminate()
-                process.wait()
-                rich.print(f"[bold red]CRITICAL ERROR: {output} failed![/bold red]")
-                os._exit(1)
-
-        error_output = process.stderr.readline()
-        if error_output:
-            if "ERROR" in output or "Error" in output or "error" in output:
-                process.terminate()
-                process.wait()
-                rich.print(f"[bold red]CRITICAL ERROR: {output} failed![/bold red]")
-                os._exit(1)
-
-        # Check if process is still running
-        if process.poll() is not None:
-            break  # Exit loop when process completes
-
-    process.wait()  # Ensure process is fully done before exiting
+def failure_results(report_dir, test_name, iteration, output_tags, failure):
+    """Returns the results recorded for a failed test, and saves the log of the stage
+       that failed to "<report dir>/logs/<kind>/<test name>_<iteration>.log".
+
+    Args:
+        report_dir (str): The report directory.
+        test_name (str): The name of the test.
+        iteration (int): The iteration of the test.
+        output_tags (list): The tags of the test results.
+        failure (TestFailure): The failure, e.g. a StageTimeout.
+
+    Returns:
+        list: A single result, with every tag set to "TIMEOUT" or "FAILED", the kind
+            of the failure and the path of its log.
+    """
+    log_path = os.path.join(
+        report_dir, "logs", failure.kind, f"{test_name}_{iteration}.log"
+    )
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, "w", encoding="utf-8") as f:
+        f.write(f"Test {test_name}, iteration {iteration}: {failure}\n\n")
+        f.writelines(failure.log)
+
+    if isinstance(failure, StageTimeout):
+        result = {tag: "TIMEOUT" for tag in output_tags}
+        result["Timeout"] = failure.stage
+    else:
+        result = {tag: "FAILED" for tag in output_tags}
+    result["Failure"] = failure.kind
+    result["Log"] = log_path
+    return [result]
 
 
 def get_sweep_parameters(iteration, parameters):
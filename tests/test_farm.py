@@ -0,0 +1,166 @@
+# Copyright (C) 2025 Politecnico di Torino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Runs whole campaigns on farms of fake FPGA boards (see testit.fake_board)
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+MAKEFILE = """\
+sw-fpga:
+\t@mkdir -p sw/$(app)/build && touch sw/$(app)/build/app.elf
+deb-setup:
+\t@true
+sw-sim:
+\t@true
+sim-build:
+\t@true
+sim-run:
+\t@true
+fpga-build:
+\t@true
+fpga-load:
+\t@true
+"""
+
+CONFIG = """\
+{
+  target: {
+    name: "fake", type: "fpga", iterations: %(iterations)d, outputFile: "", baudrate: 115200,
+    timeouts: {run: 5}, elf: "{app_dir}/build/%(elf)s", gdbInterface: "%(interface)s",
+    boards: [
+      {name: "left", backend: "fake"},
+      {name: "right", backend: "fake"}
+    ]
+  }
+  report: {dir: "report"}
+  tests: [
+    {
+      appName: "app", dir: "sw/app", genFilesName: "test_data",
+      outputFormat: "(\\\\d+):(\\\\d+):(\\\\d+)", outputTags: ["TestID", "Cycles", "Outcome"],
+      parameters: [{name: "SIZE", value: 4}],
+      inputDataset: [{name: "A", dataType: "uint8_t", valueRange: [0, 256], dimensions: ["SIZE"]}],
+      outputDataset: [{name: "B", dataType: "int32_t"}],
+      goldenResultFunction: {name: "square"}
+    }
+  ]
+}
+"""
+
+GOLDEN = """\
+import numpy as np
+
+def square(inputs, parameters):
+    return [inputs[0].astype(np.int32) ** 2]
+"""
+
+# Fails, and with it the dataset generation of every test
+FAILING_GOLDEN = """\
+def square(inputs, parameters):
+    with open("golden.log", "a") as f:
+        f.write("called\\n")
+    raise ValueError("no golden results")
+"""
+
+
+def run_campaign(
+    tmp_path, iterations, faults=None, golden=GOLDEN, interface="cli", elf="app.elf"
+):
+    (tmp_path / "sw" / "app").mkdir(parents=True)
+    (tmp_path / "Makefile").write_text(MAKEFILE)
+    (tmp_path / "config.test").write_text(
+        CONFIG % {"iterations": iterations, "interface": interface, "elf": elf}
+    )
+    boards = {"left": {"output": ["0:10:1"]}, "right": {"output": ["0:20:1"]}}
+    for name, fault in (faults or {}).items():
+        boards[name].update(fault)
+    (tmp_path / "testit_golden.py").write_text(golden)
+
+    process = subprocess.run(
+        [sys.executable, "-m", "testit.main", "run", "--nobuild"],
+        cwd=tmp_path,
+        env=dict(os.environ, COLUMNS="200", TESTIT_FAKE_BOARDS=json.dumps(boards)),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+        timeout=120,
+    )
+    results_path = tmp_path / "report" / "test_results.jsonl"
+    results = []
+    if results_path.exists():
+        with open(results_path) as f:
+            results = [json.loads(line)["result"] for line in f if line.strip()]
+    return process, results
+
+
+@pytest.mark.parametrize("interface", ["cli", "mi"])
+def test_two_board_farm(tmp_path, interface):
+    process, results = run_campaign(tmp_path, iterations=6, interface=interface)
+
+    assert process.returncode == 0, process.stdout
+    assert len(results) == 6
+    # Each board prints its own cycle count: both of them took tests
+    assert {result["Cycles"] for result in results} == {"10", "20"}
+    # No test failed on a board and had to run again
+    with open(tmp_path / "report" / "board_health.json") as f:
+        health = json.load(f)
+    assert [board["testsFailed"] for board in health.values()] == [0, 0]
+    assert not (tmp_path / "report" / ".testit_staging").exists()
+
+
+def test_failed_board_is_retried_on_the_farm(tmp_path):
+    process, results = run_campaign(
+        tmp_path, iterations=4, faults={"right": {"failures": 1}}
+    )
+
+    assert process.returncode == 0, process.stdout
+    assert len(results) == 4
+    assert all("Failure" not in result for result in results)
+
+
+def test_retry_goes_to_another_board(tmp_path):
+    # The left board takes the only test and crashes
+    process, results = run_campaign(
+        tmp_path, iterations=1, faults={"left": {"failures": 1}}
+    )
+
+    assert process.returncode == 0, process.stdout
+    assert [result["Cycles"] for result in results] == ["20"]
+    with open(tmp_path / "report" / "board_health.json") as f:
+        health = json.load(f)
+    assert health["left"]["testsRun"] == 1
+
+
+def test_farm_stops_on_error(tmp_path):
+    process, results = run_campaign(tmp_path, iterations=6, golden=FAILING_GOLDEN)
+
+    assert process.returncode != 0
+    assert results == []
+    # The boards take no more work once the campaign failed
+    assert len((tmp_path / "golden.log").read_text().split()) == 1
+    assert not (tmp_path / "report" / ".testit_staging").exists()
+
+
+def test_farm_stops_on_board_exception(tmp_path):
+    # Staging the image raises FileNotFoundError on every board
+    process, results = run_campaign(tmp_path, iterations=4, elf="wrong.elf")
+
+    assert process.returncode != 0
+    assert "stopped" in process.stdout
+    assert results == []
@@ -0,0 +1,56 @@
+# Copyright (C) 2025 Politecnico di Torino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+import re
+
+import pytest
+
+from testit.result_parser import ResultParser, required_literal
+
+# Patterns and lines that the literal prefilter must not discard if the regex matches
+SAMPLES = [
+    (r"Cycles: (\d+)", ["Cycles: 42", "cycles: 42", "Cycles:42"]),
+    (r"\x41:(\d+)", ["A:5", "x41:5", "41:5"]),
+    (r"\101:(\d+)", ["A:5", "101:5"]),
+    (r"AB:(\d+)", ["AB:5", "u0041B:5"]),
+    (r"\N{LATIN CAPITAL LETTER A}:(\d+)", ["A:5", "N{LATIN CAPITAL LETTER A}:5"]),
+    (r"(\w)\1=(\d+)", ["aa=3", "ab=3"]),
+    (r"\tres\.(\d+)", ["\tres.7", "tres.7"]),
+    (r"ab+c=(\d+)", ["abbbc=1", "abc=1", "ac=1"]),
+    (r"x{2}y=(\d+)", ["xxy=1", "xy=1"]),
+    (r"\[(\w+)\] (\d+)", ["[ok] 1", "ok 1"]),
+    (r"(?:err|ok) (\d+)", ["err 1", "ok 2"]),
+    (r"a|b=(\d+)", ["a", "b=1"]),
+]
+
+
+@pytest.mark.parametrize("pattern, lines", SAMPLES)
+def test_prefilter_matches_search(pattern, lines):
+    literal = required_literal(pattern)
+    parser = ResultParser(
+        pattern, [f"tag{i}" for i in range(re.compile(pattern).groups)]
+    )
+    for line in lines:
+        match = re.search(pattern, line)
+        if match:
+            assert literal in line
+        assert parser.parse_lines([line]) == (
+            [dict(zip(parser.output_tags, match.groups()))] if match else []
+        )
+
+
+def test_escaped_code_is_not_literal():
+    assert "41" not in required_literal(r"\x41:(\d+)")
+    assert required_literal(r"\x41:(\d+)") == ":"